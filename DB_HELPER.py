@@ -1,13 +1,95 @@
 import sqlite3
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import os
 from werkzeug.security import generate_password_hash, check_password_hash
+from records import (
+    AdminRow,
+    AdminSession,
+    AttendanceRow,
+    CourseRow,
+    ScanRow,
+    StudentDetail,
+    StudentRef,
+    StudentRow,
+    fetch_record,
+    fetch_records
+)
 
-DB_PATH = 'attendance.db'
+# Database of the default campus; other campuses are shards (see campuses.py)
+DB_PATH = os.environ.get('ATTENDANCE_DB', 'attendance.db')
+# Idle connections kept per database file
+POOL_SIZE = int(os.environ.get('ATTENDANCE_POOL_SIZE', '8'))
+
+_active_db = contextvars.ContextVar('active_db', default=None)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def db_path():
+    """Database file for the current request or script: the active shard, else DB_PATH."""
+    return _active_db.get() or DB_PATH
+
+@contextmanager
+def use_database(path):
+    """Make `path` the active database for code run inside the with-block."""
+    token = _active_db.set(path)
+    try:
+        yield path
+    finally:
+        _active_db.reset(token)
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its database's pool."""
+
+    def close(self):
+        _release(self)
+
+def connect(path=None):
+    """Return a connection to `path` (default: the active database) from its pool.
+
+    Callers use it exactly like sqlite3.connect(); close() returns it to the
+    pool, keeping up to POOL_SIZE idle connections per database file.
+    """
+    path = path or db_path()
+    with _pools_lock:
+        idle = _pools.get(path)
+        if idle:
+            return idle.pop()
+    conn = sqlite3.connect(path, factory=_PooledConnection, check_same_thread=False)
+    conn.pool_key = path
+    return conn
+
+def _release(conn):
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        # Archive readers ATTACH extra files; the next borrower must not see them
+        for _, name, _ in conn.execute('PRAGMA database_list').fetchall():
+            if name not in ('main', 'temp'):
+                conn.execute(f'DETACH DATABASE {name}')
+        conn.row_factory = None
+    except sqlite3.Error:
+        sqlite3.Connection.close(conn)
+        return
+    with _pools_lock:
+        idle = _pools.setdefault(conn.pool_key, [])
+        if conn in idle:
+            return
+        if len(idle) < POOL_SIZE:
+            idle.append(conn)
+            return
+    sqlite3.Connection.close(conn)
+
+# Tables whose writes are tracked in data_versions
+VERSIONED_TABLES = ('admins', 'students', 'courses', 'attendance', 'enrollment', 'attendance_archives')
 
 def init_db():
     """Initialize the SQLite database with required tables."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     
     # Create Admins table
@@ -66,7 +148,74 @@ def init_db():
         UNIQUE(student_id, course_id)
     )''')
     
+    # Catalog of closed terms moved out of attendance (see attendance_archive.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS attendance_archives (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        term TEXT UNIQUE NOT NULL,
+        path TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_attendance_checkin ON attendance(check_in_time)')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_attendance_student_course
+                 ON attendance(student_id, course_id, check_in_time)''')
+    
+    # Client-generated scan ids make kiosk retries idempotent (see scan_dedupe.py);
+    # the partial unique index rejects a repeated id while allowing untagged scans
+    columns = {row[1] for row in c.execute('PRAGMA table_info(attendance)')}
+    if 'scan_id' not in columns:
+        c.execute('ALTER TABLE attendance ADD COLUMN scan_id TEXT')
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_scan_id
+                 ON attendance(scan_id) WHERE scan_id IS NOT NULL''')
+    
+    # Offline kiosks sync the roster by version: each student insert, update or
+    # delete gives that IDNO a new version here (one row per IDNO, replaced)
+    c.execute('''CREATE TABLE IF NOT EXISTS roster_changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT UNIQUE NOT NULL
+    )''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_students_insert_roster
+                 AFTER INSERT ON students
+                 BEGIN
+                     INSERT OR REPLACE INTO roster_changes (student_id) VALUES (NEW.student_id);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_students_update_roster
+                 AFTER UPDATE OF student_id, name, photo ON students
+                 BEGIN
+                     INSERT OR REPLACE INTO roster_changes (student_id)
+                         SELECT OLD.student_id WHERE OLD.student_id <> NEW.student_id;
+                     INSERT OR REPLACE INTO roster_changes (student_id) VALUES (NEW.student_id);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_students_delete_roster
+                 AFTER DELETE ON students
+                 BEGIN
+                     INSERT OR REPLACE INTO roster_changes (student_id) VALUES (OLD.student_id);
+                 END''')
+    # Students that predate the log start at the first versions
+    c.execute('''INSERT INTO roster_changes (student_id)
+                 SELECT student_id FROM students
+                 WHERE NOT EXISTS (SELECT 1 FROM roster_changes)''')
+    
+    # Per-table change counters, bumped by triggers on every write so response
+    # caches can tell when their data is stale (even for writes from scripts)
+    c.execute('''CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )''')
+    for table in VERSIONED_TABLES:
+        c.execute('INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)', (table,))
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version
+                          AFTER {op} ON {table}
+                          BEGIN
+                              UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                          END''')
+    
     conn.commit()
+    # WAL lets reports and snapshots read while scans keep writing
+    c.execute('PRAGMA journal_mode=WAL').fetchone()
     conn.close()
     ensure_default_course()
     print("Database initialized successfully!")
@@ -74,7 +223,7 @@ def init_db():
 
 def ensure_default_course():
     """Guarantee there is at least one default course; return its id."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute(
         'SELECT id FROM courses WHERE course_code = ? LIMIT 1',
@@ -95,10 +244,19 @@ def ensure_default_course():
     conn.close()
     return course_id
 
+def get_data_versions(tables):
+    """Return a tuple with the current data_versions counter for each table name."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('SELECT name, version FROM data_versions')
+    versions = dict(c.fetchall())
+    conn.close()
+    return tuple(versions.get(t, 0) for t in tables)
+
 # Admin functions
 def add_admin(email, password, name):
     """Add a new admin user; stores a hashed password."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     hashed = generate_password_hash(password)
     try:
@@ -113,7 +271,7 @@ def add_admin(email, password, name):
 
 def get_admin(email, password):
     """Verify admin login credentials with hashed passwords; auto-upgrade plaintext rows."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('SELECT id, name, email, password FROM admins WHERE email = ?', (email,))
     row = c.fetchone()
@@ -142,20 +300,20 @@ def get_admin(email, password):
             pass
 
     conn.close()
-    return (admin_id, name, email_val) if valid else None
+    return AdminSession(admin_id, name, email_val) if valid else None
 
 def get_all_admins():
     """Get all admin users."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('SELECT id, name, email, password FROM admins ORDER BY id ASC')
-    rows = c.fetchall()
+    rows = fetch_records(c, AdminRow)
     conn.close()
     return rows
 
 def delete_admin(admin_id):
     """Delete an admin user by ID."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('DELETE FROM admins WHERE id = ?', (admin_id,))
     conn.commit()
@@ -164,16 +322,16 @@ def delete_admin(admin_id):
 
 def get_admin_by_id(admin_id):
     """Get a single admin by ID."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('SELECT id, name, email, password FROM admins WHERE id = ?', (admin_id,))
-    row = c.fetchone()
+    row = fetch_record(c, AdminRow)
     conn.close()
     return row
 
 def update_admin(admin_id, name, email, password=None):
     """Update an admin user. If password is provided, hash and update it."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     
     if password:
@@ -191,7 +349,7 @@ def update_admin(admin_id, name, email, password=None):
 # Student functions
 def add_student(student_id, name, email, qr_code=None):
     """Add a new student."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     try:
         c.execute('INSERT INTO students (student_id, name, email, qr_code) VALUES (?, ?, ?, ?)',
@@ -205,16 +363,61 @@ def add_student(student_id, name, email, qr_code=None):
 
 def get_student_by_qr(qr_code):
     """Get student by QR code or student_id fallback."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('SELECT id, student_id, name, email FROM students WHERE qr_code = ? OR student_id = ? LIMIT 1', (qr_code, qr_code))
-    student = c.fetchone()
+    student = fetch_record(c, StudentRef)
+    conn.close()
+    return student
+
+def get_students_by_qr(values):
+    """Bulk get_student_by_qr: return {value: StudentRef} for the values that match a student."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('''SELECT j.value, s.id, s.student_id, s.name, s.email
+                 FROM json_each(?) j
+                 JOIN students s ON s.qr_code = j.value OR s.student_id = j.value''',
+              (json.dumps(list(values)),))
+    students = {}
+    for row in c.fetchall():
+        students.setdefault(row[0], StudentRef._make(row[1:]))
+    conn.close()
+    return students
+
+def get_all_students():
+    """Get all students for the management listing (text columns never NULL)."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('''SELECT id, student_id, last_name, first_name, course, level, COALESCE(photo, '')
+                 FROM students''')
+    students = fetch_records(c, StudentRow)
+    conn.close()
+    return students
+
+def get_student_row(student_pk):
+    """Get one student's listing row by students.id."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('''SELECT id, student_id, last_name, first_name, course, level, COALESCE(photo, '')
+                 FROM students WHERE id = ?''', (student_pk,))
+    student = fetch_record(c, StudentRow)
+    conn.close()
+    return student
+
+def get_student_detail(student_idno):
+    """Get full display details for a student by IDNO (text columns never NULL)."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('''SELECT id, student_id, name, COALESCE(last_name, ''), COALESCE(first_name, ''),
+                        COALESCE(email, ''), COALESCE(course, ''), COALESCE(level, ''), COALESCE(photo, '')
+                 FROM students WHERE student_id = ?''', (student_idno,))
+    student = fetch_record(c, StudentDetail)
     conn.close()
     return student
 
 def update_student_qr(student_id, qr_code):
     """Update student's QR code."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     try:
         c.execute('UPDATE students SET qr_code = ? WHERE id = ?', (qr_code, student_id))
@@ -228,7 +431,7 @@ def update_student_qr(student_id, qr_code):
 # Course functions
 def add_course(course_code, course_name, instructor, time_slot):
     """Add a new course."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     try:
         c.execute('INSERT INTO courses (course_code, course_name, instructor, time_slot) VALUES (?, ?, ?, ?)',
@@ -242,17 +445,17 @@ def add_course(course_code, course_name, instructor, time_slot):
 
 def get_all_courses():
     """Get all courses."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('SELECT id, course_code, course_name, instructor, time_slot FROM courses')
-    courses = c.fetchall()
+    courses = fetch_records(c, CourseRow)
     conn.close()
     return courses
 
 # Attendance functions
 def record_attendance(student_id, course_id, qr_code_scanned):
     """Record student attendance."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     try:
         c.execute('INSERT INTO attendance (student_id, course_id, qr_code_scanned) VALUES (?, ?, ?)',
@@ -264,9 +467,66 @@ def record_attendance(student_id, course_id, qr_code_scanned):
     finally:
         conn.close()
 
+def record_scan(student_id, course_id, qr_code_scanned, scan_id):
+    """Record attendance for a tagged scan at most once.
+
+    Returns (ScanRow, created): the row holding scan_id and whether this call
+    inserted it. Returns None on a database error.
+    """
+    recorded = record_scans([(student_id, course_id, qr_code_scanned, scan_id, None)])
+    if recorded is None:
+        return None
+    return recorded.get(scan_id, (None, False))
+
+def get_scan(scan_id):
+    """Return the ScanRow recorded under scan_id, or None."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('SELECT id, student_id, course_id, check_in_time FROM attendance WHERE scan_id = ?', (scan_id,))
+    row = fetch_record(c, ScanRow)
+    conn.close()
+    return row
+
+def record_scans(scans):
+    """Record a batch of tagged scans in one transaction, each scan_id at most once.
+
+    scans holds (student_id, course_id, qr_code_scanned, scan_id, check_in_time)
+    tuples; a None check_in_time means now. Returns {scan_id: (ScanRow, created)},
+    or None on a database error. Scans already moved into a term archive are
+    returned from there, not recorded again.
+    """
+    # attendance_archive imports this module, so it is imported here
+    from attendance_archive import archived_scans
+    scan_ids = json.dumps([scan[3] for scan in scans])
+    conn = connect()
+    c = conn.cursor()
+    try:
+        # Late replays may find their scan already moved to a term archive
+        archived = archived_scans(conn, [scan[3] for scan in scans],
+                                  min((scan[4] for scan in scans if scan[4]), default=None))
+        # IMMEDIATE takes the write lock first, so `existing` cannot go stale
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('''SELECT scan_id FROM attendance
+                     WHERE scan_id IN (SELECT value FROM json_each(?))''', (scan_ids,))
+        existing = {row[0] for row in c.fetchall()}
+        c.executemany('''INSERT INTO attendance (student_id, course_id, qr_code_scanned, scan_id, check_in_time)
+                         VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                         ON CONFLICT(scan_id) WHERE scan_id IS NOT NULL DO NOTHING''',
+                      [scan for scan in scans if scan[3] not in archived])
+        conn.commit()
+        c.execute('''SELECT scan_id, id, student_id, course_id, check_in_time FROM attendance
+                     WHERE scan_id IN (SELECT value FROM json_each(?))''', (scan_ids,))
+        recorded = {row[0]: (ScanRow._make(row[1:]), row[0] not in existing) for row in c.fetchall()}
+        recorded.update((scan_id, (row, False)) for scan_id, row in archived.items())
+        return recorded
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
 def get_attendance(course_id, date=None):
     """Get attendance records for a course."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     if date:
         c.execute('''SELECT a.id, s.student_id, s.name, a.check_in_time, a.qr_code_scanned
@@ -280,14 +540,14 @@ def get_attendance(course_id, date=None):
                      JOIN students s ON a.student_id = s.id
                      WHERE a.course_id = ?
                      ORDER BY a.check_in_time DESC''', (course_id,))
-    records = c.fetchall()
+    records = fetch_records(c, AttendanceRow)
     conn.close()
     return records
 
 # Enrollment functions
 def enroll_student(student_id, course_id):
     """Enroll a student in a course."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     try:
         c.execute('INSERT INTO enrollment (student_id, course_id) VALUES (?, ?)',
@@ -299,27 +559,64 @@ def enroll_student(student_id, course_id):
     finally:
         conn.close()
 
+def bulk_enroll_students(course_id, student_idnos):
+    """Enroll many students (by IDNO) in a course in one transaction.
+
+    Returns {'added', 'skipped', 'unknown', 'unknown_ids'} or None if the
+    course does not exist. skipped counts students already enrolled (and
+    repeated IDNOs in the input).
+    """
+    idnos = [str(i).strip() for i in student_idnos if str(i).strip()]
+    conn = connect()
+    c = conn.cursor()
+    try:
+        c.execute('SELECT 1 FROM courses WHERE id = ?', (course_id,))
+        if not c.fetchone():
+            return None
+        # Resolve every IDNO in a single query; json_each avoids the bound-parameter limit
+        c.execute('SELECT student_id, id FROM students WHERE student_id IN (SELECT value FROM json_each(?))',
+                  (json.dumps(idnos),))
+        found = dict(c.fetchall())
+        unknown_ids = [i for i in dict.fromkeys(idnos) if i not in found]
+        rows = [(found[i], course_id) for i in idnos if i in found]
+
+        c.executemany('INSERT OR IGNORE INTO enrollment (student_id, course_id) VALUES (?, ?)', rows)
+        # rowcount sums direct inserts only (ignored rows and trigger writes excluded)
+        added = max(c.rowcount, 0)
+        conn.commit()
+        return {
+            'added': added,
+            'skipped': len(rows) - added,
+            'unknown': len(unknown_ids),
+            'unknown_ids': unknown_ids
+        }
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
 def get_student_courses(student_id):
     """Get all courses a student is enrolled in."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('''SELECT c.id, c.course_code, c.course_name, c.instructor, c.time_slot
                  FROM courses c
                  JOIN enrollment e ON c.id = e.course_id
                  WHERE e.student_id = ?''', (student_id,))
-    courses = c.fetchall()
+    courses = fetch_records(c, CourseRow)
     conn.close()
     return courses
 
 def get_course_students(course_id):
     """Get all students enrolled in a course."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     c = conn.cursor()
     c.execute('''SELECT s.id, s.student_id, s.name, s.email
                  FROM students s
                  JOIN enrollment e ON s.id = e.student_id
                  WHERE e.course_id = ?''', (course_id,))
-    students = c.fetchall()
+    students = fetch_records(c, StudentRef)
     conn.close()
     return students
 
@@ -0,0 +1,245 @@
+"""
+Per-student attendance analytics for a course over a term.
+
+One query loads every check-in for the course and date range (hot table and
+any overlapping archives) as a single packed string, parsed into numpy
+columns: student, day offset and local minute of day. These are scattered into a students x sessions matrix, where
+sessions are the meeting dates implied by courses.time_slot. Attendance
+rate, lateness and consecutive-absence streaks are then computed with array
+operations, never a Python loop over rows or students.
+
+Results are cached per (database, course, start, end, data versions), so repeated
+dashboard polls are free until attendance or enrollment changes.
+"""
+import json
+import threading
+from collections import OrderedDict, namedtuple
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from attendance_archive import attach_archives, attendance_union
+from DB_HELPER import connect, db_path, get_data_versions
+from records import StudentRef, fetch_records
+from rosters import get_course, get_course_roster, get_course_schedule
+
+# Minutes after the scheduled start before a check-in counts as late
+LATE_GRACE_MINUTES = 10
+# Check-ins earlier than this before the start, or after the scheduled end,
+# are not attendance for that session (e.g. a scan at 23:30 for a 09:00 class)
+EARLY_CHECKIN_MINUTES = 30
+# A student is flagged at risk when any of these thresholds is crossed
+AT_RISK_STREAK = 3
+AT_RISK_RATE = 0.8
+AT_RISK_LATE_SHARE = 0.5
+CACHE_MAX_ENTRIES = 64
+# Accepted term bounds: epoch/local-time conversions need dates after 1970,
+# and a term longer than a few years is never a real request
+MIN_DATE = date(1971, 1, 1)
+MAX_TERM_DAYS = 3 * 366
+
+# student_id * _PACK + epoch minute; epoch minutes stay below 2**26 until 2097
+_PACK = 1 << 26
+# Epoch seconds of check_in_time. julianday() exists on every SQLite (unlike
+# unixepoch(), 3.38+) and is about twice as fast as strftime('%s'); the +0.5
+# rounds away float error so whole-second timestamps convert exactly.
+_EPOCH_SECONDS = "CAST((julianday(a.check_in_time) - 2440587.5) * 86400 + 0.5 AS INTEGER)"
+
+_VERSION_TABLES = ('attendance', 'enrollment', 'courses', 'students', 'attendance_archives')
+
+StudentMetrics = namedtuple('StudentMetrics', (
+    'id student_id name sessions attended absences attendance_rate late_count '
+    'avg_late_minutes longest_absence_streak current_absence_streak at_risk'
+))
+
+# One %-template per StudentMetrics row: the same JSON as records.records_json
+# at half the cost, since no dict is built per student
+_ROW_JSON = '{' + ','.join(f'"{field}":%s' for field in StudentMetrics._fields) + '}'
+_json = json.JSONEncoder(separators=(',', ':')).encode
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def session_dates(schedule, start, end, now=None):
+    """Meeting dates of a schedule between start and end that have already finished."""
+    if schedule is None:
+        return []
+    weekdays, _, end_minute = schedule
+    now = now or datetime.now()
+    today = now.date()
+    # Today's meeting only counts once the class is over
+    if now.hour * 60 + now.minute <= end_minute:
+        today -= timedelta(days=1)
+    last = min(end, today)
+    days = (last - start).days + 1
+    return [start + timedelta(days=i) for i in range(max(days, 0))
+            if (start + timedelta(days=i)).weekday() in weekdays]
+
+
+def _utc_offsets(first_day, last_day):
+    """Local UTC offset in minutes for each UTC epoch day in first_day..last_day (noon samples)."""
+    return np.array(
+        [time.localtime(d * 86400 + 43200).tm_gmtoff // 60 for d in range(first_day, last_day + 1)],
+        dtype=np.int64
+    )
+
+
+def _load_checkins(course_id, start, end):
+    """Return (student_pk, day_offset, minute) columns for the course's check-ins in range.
+
+    day_offset counts local days from start; minute is the local minute of day.
+    """
+    # Widen the UTC window by a day either side; exact local-date filtering happens below
+    lo = (start - timedelta(days=1)).isoformat()
+    hi = (end + timedelta(days=2)).isoformat()
+    conn = connect()
+    try:
+        source = attendance_union(attach_archives(conn, start.isoformat(), end.isoformat()))
+        # Each row is packed into one integer and the whole result comes back as
+        # a single string, so SQLite does the per-row work and Python sees one value.
+        # The unary + keeps SQLite from walking the check_in_time index row by row.
+        packed = conn.execute(f'''
+            SELECT group_concat(a.student_id * {_PACK} + {_EPOCH_SECONDS} / 60)
+            FROM {source} a
+            WHERE a.course_id = ? AND +a.check_in_time >= ? AND +a.check_in_time < ?
+        ''', (course_id, lo, hi)).fetchone()[0]
+    finally:
+        conn.close()
+    values = np.fromstring(packed, sep=',', dtype=np.int64) if packed else np.zeros(0, dtype=np.int64)
+    pk_col, utc_minutes = np.divmod(values, _PACK)
+
+    first_day = (start - date(1970, 1, 1)).days - 1
+    offsets = _utc_offsets(first_day, first_day + (end - start).days + 3)
+    utc_day = np.clip(utc_minutes // 1440 - first_day, 0, len(offsets) - 1)
+    local_minutes = utc_minutes + offsets[utc_day]
+    day_col = local_minutes // 1440 - (first_day + 1)
+    minute_col = local_minutes % 1440
+    in_range = (day_col >= 0) & (day_col <= (end - start).days)
+    return pk_col[in_range], day_col[in_range], minute_col[in_range]
+
+
+def _students_by_id(student_pks):
+    conn = connect()
+    c = conn.cursor()
+    c.execute('''SELECT id, student_id, name, email FROM students
+                 WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id''',
+              (json.dumps([int(i) for i in student_pks]),))
+    students = fetch_records(c, StudentRef)
+    conn.close()
+    return students
+
+
+def _run_lengths(flags):
+    """For a 2-D bool array, the length of the True run ending at each column, per row."""
+    counts = np.cumsum(flags, axis=1, dtype=np.int32)
+    # Count at the most recent False, carried forward, is subtracted to restart runs
+    resets = np.where(flags, 0, counts)
+    np.maximum.accumulate(resets, axis=1, out=resets)
+    return counts - resets
+
+
+def compute_course_analytics(course_id, start, end, sessions=None):
+    """Compute StudentMetrics for every student of a course between start and end (dates)."""
+    schedule = get_course_schedule(course_id)
+    if sessions is None:
+        sessions = session_dates(schedule, start, end)
+    class_start, class_end = schedule[1:] if schedule else (0, 1439)
+
+    pk_col, day_col, minute_col = _load_checkins(course_id, start, end)
+    roster = get_course_roster(course_id)
+    students = roster or _students_by_id(np.unique(pk_col))
+    n, m = len(students), len(sessions)
+
+    student_ids = np.fromiter((s.id for s in students), dtype=np.int64, count=n)
+    order = np.argsort(student_ids)
+    session_offsets = np.fromiter(((d - start).days for d in sessions), dtype=np.int64, count=m)
+
+    # Map each check-in to (student row, session column); drop rows matching neither
+    # or falling outside the session's time window
+    srow = np.searchsorted(student_ids, pk_col, sorter=order)
+    srow = np.minimum(srow, max(n - 1, 0))
+    scol = np.minimum(np.searchsorted(session_offsets, day_col), max(m - 1, 0))
+    valid = np.zeros(len(pk_col), dtype=bool)
+    if n and m:
+        srow = order[srow]
+        valid = (student_ids[srow] == pk_col) & (session_offsets[scol] == day_col)
+        valid &= (minute_col >= class_start - EARLY_CHECKIN_MINUTES) & (minute_col <= class_end)
+    srow, scol, minutes = srow[valid], scol[valid], minute_col[valid]
+
+    # Earliest check-in minute per (student, session); sentinel means absent
+    sentinel = np.iinfo(np.int32).max
+    first_in = np.full((n, m), sentinel, dtype=np.int32)
+    np.minimum.at(first_in, (srow, scol), minutes.astype(np.int32))
+    present = first_in != sentinel
+
+    attended = present.sum(axis=1)
+    absences = m - attended
+    late_by = np.where(present, np.maximum(first_in - class_start, 0), 0)
+    late = late_by > LATE_GRACE_MINUTES
+    late_count = late.sum(axis=1)
+    late_total = np.where(late, late_by, 0).sum(axis=1)
+    rate = attended / m if m else np.ones(n)
+    avg_late = np.where(late_count > 0, late_total / np.maximum(late_count, 1), 0.0)
+    late_share = np.where(attended > 0, late_count / np.maximum(attended, 1), 0.0)
+
+    runs = _run_lengths(~present) if m else np.zeros((n, 1), dtype=np.int32)
+    longest = runs.max(axis=1) if n else np.zeros(0, dtype=np.int32)
+    current = runs[:, -1] if n else np.zeros(0, dtype=np.int32)
+    at_risk = (current >= AT_RISK_STREAK) | (rate < AT_RISK_RATE) | (late_share > AT_RISK_LATE_SHARE)
+
+    # tolist() converts whole columns to Python scalars at C speed
+    columns = zip(
+        attended.tolist(), absences.tolist(), np.round(rate, 4).tolist(), late_count.tolist(),
+        np.round(avg_late, 1).tolist(), longest.tolist(), current.tolist(), at_risk.tolist()
+    )
+    return [
+        StudentMetrics(s.id, s.student_id, s.name, m, *metrics)
+        for s, metrics in zip(students, columns)
+    ]
+
+
+def _encode(course, start, end, sessions, metrics):
+    head = _json({
+        'success': True,
+        'course': course._asdict(),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'sessions': sessions,
+        'at_risk': sum(1 for m in metrics if m.at_risk),
+    })[:-1]
+    # Numbers are already Python ints and finite floats, whose str() is valid JSON
+    rows = ','.join([
+        _ROW_JSON % (pk, _json(student_id), _json(name), n, attended, absences, rate, late_count,
+                     avg_late, longest, current, 'true' if at_risk else 'false')
+        for (pk, student_id, name, n, attended, absences, rate, late_count,
+             avg_late, longest, current, at_risk) in metrics
+    ])
+    return f'{head},"students":[{rows}]}}'
+
+
+def get_course_analytics(course_id, start, end):
+    """Cached compute_course_analytics; returns (course, session_count, metrics, json_body) or None for unknown courses.
+
+    json_body is the encoded endpoint response, cached alongside the metrics
+    so repeated polls skip serialization too.
+    """
+    course = get_course(course_id)
+    if course is None:
+        return None
+    sessions = session_dates(get_course_schedule(course_id), start, end)
+    # The finished-session count is in the key: it grows as meetings end
+    key = (db_path(), course_id, start, end, len(sessions), get_data_versions(_VERSION_TABLES))
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    metrics = compute_course_analytics(course_id, start, end, sessions)
+    result = (course, len(sessions), metrics, _encode(course, start, end, len(sessions), metrics))
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return result
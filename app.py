@@ -1,33 +1,97 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, json
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, json, Response
 import os
-import sqlite3
+import io
+import csv
+import hmac
+import math
+import time
 import base64
 import uuid
+import segno
 from werkzeug.security  import generate_password_hash
 from DB_HELPER import (
+    DB_PATH,
+    connect,
+    db_path,
+    use_database,
     init_db,
     get_admin,
     get_student_by_qr,
     record_attendance,
+    get_scan,
+    record_scan,
+    record_scans,
+    get_students_by_qr,
     get_all_courses,
     ensure_default_course,
     get_all_admins,
     add_admin,
     delete_admin,
     get_admin_by_id,
-    update_admin
+    update_admin,
+    bulk_enroll_students,
+    get_all_students,
+    get_student_row,
+    get_student_detail
+)
+from bulk_enroll import parse_student_ids_csv
+from kiosk import roster_json
+from campuses import (
+    CampusMiddleware,
+    CampusSessionInterface,
+    all_databases,
+    current_campus,
+    enter_campus,
+    leave_campus
+)
+from attendance_archive import get_attendance_report, list_archives
+from analytics import (
+    MAX_TERM_DAYS as ANALYTICS_MAX_TERM_DAYS,
+    MIN_DATE as ANALYTICS_MIN_DATE,
+    get_course_analytics
+)
+from response_cache import cached_response, compress_response
+from static_assets import asset_url, send_asset
+from snapshot import snapshot_info, start_scheduler as start_snapshot_scheduler
+from rosters import get_course, is_enrolled, resolve_course, invalidate as invalidate_rosters
+from records import CourseRef, records_json
+from qr_payload import decode_payload, encode_payload, INVALID, SIGNED
+from scan_dedupe import (
+    IDEMPOTENCY_HEADER,
+    REPLAY_HEADER,
+    lookup_response,
+    normalize_scan_id,
+    remember_response
 )
 
 app = Flask(__name__)
 # Prefer environment-provided secret key for session integrity
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-secret-change-me')
+# When set, only signed QR payloads are accepted (legacy JSON/plain IDs rejected)
+REQUIRE_SIGNED_QR = os.environ.get('QR_REQUIRE_SIGNED') == '1'
+# Offline kiosks: shared secret for /kiosk/* (kiosk endpoints are disabled when unset),
+# scans per /kiosk/sync request, and the window a queued scan is accepted in
+KIOSK_TOKEN = os.environ.get('KIOSK_TOKEN', '')
+KIOSK_SYNC_BATCH = int(os.environ.get('KIOSK_SYNC_BATCH', '200'))
+KIOSK_MAX_SCAN_AGE = float(os.environ.get('KIOSK_MAX_SCAN_AGE', str(7 * 24 * 3600)))
+KIOSK_CLOCK_SKEW = 300
 
 # Reuse the existing attendance database for users as well
-USERS_DB = os.path.join(os.path.dirname(__file__), 'attendance.db')
-
-# Initialize DB every startup to ensure tables/seed data exist
-init_db()
-DEFAULT_COURSE_ID = ensure_default_course()
+USERS_DB = DB_PATH
+
+# Initialize every campus database at startup to ensure tables/seed data exist
+DEFAULT_COURSE_IDS = {}
+for _database in all_databases():
+    with use_database(_database):
+        init_db()
+        DEFAULT_COURSE_IDS[_database] = ensure_default_course()
+DEFAULT_COURSE_ID = DEFAULT_COURSE_IDS[DB_PATH]
+
+# Route each request to its campus database (see campuses.py)
+app.wsgi_app = CampusMiddleware(app.wsgi_app)
+app.session_interface = CampusSessionInterface()
+app.before_request(enter_campus)
+app.teardown_request(leave_campus)
 
 # Ensure users table exists in app.db
 def init_users_db():
@@ -38,10 +102,43 @@ def init_users_db():
 # Initialize users DB at startup (Flask 3 removed before_first_request)
 init_users_db()
 
+# Periodic online backups for reporting; 0 disables the scheduler
+SNAPSHOT_INTERVAL = float(os.environ.get('SNAPSHOT_INTERVAL', '0'))
+# Default source for reports when ?source= is not given: 'live' or 'snapshot'
+REPORT_SOURCE = os.environ.get('REPORT_SOURCE', 'live')
+start_snapshot_scheduler(SNAPSHOT_INTERVAL, all_databases())
+
+# Compress large HTML/JSON responses that are not served from the response cache
+app.after_request(compress_response)
+
+# Templates reference vendored CSS/JS through asset_url() (see static_assets.py)
+app.jinja_env.globals['asset_url'] = asset_url
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/kiosk')
+def kiosk_page():
+    """Scanner page in offline-capable kiosk mode."""
+    return render_template('index.html', kiosk=True)
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Fingerprinted static assets with immutable caching."""
+    return send_asset(filename)
+
+
+def scanned_student_id(qr_code):
+    """Decode scanned QR text; return the student id, or None if the code must be rejected.
+
+    With QR_REQUIRE_SIGNED=1 only signed payloads are accepted (legacy JSON and plain IDs are not).
+    """
+    kind, student_id = decode_payload(qr_code)
+    if kind == INVALID or (REQUIRE_SIGNED_QR and kind != SIGNED):
+        return None
+    return student_id
+
 
 def require_admin():
     """Redirect to login if admin not authenticated."""
@@ -49,6 +146,37 @@ def require_admin():
         return redirect(url_for('login'))
     return None
 
+
+def current_course(now=None):
+    """The course whose time_slot is in session at `now`, else the campus's default course."""
+    default_id = DEFAULT_COURSE_IDS.get(db_path(), DEFAULT_COURSE_ID)
+    return resolve_course(now) or get_course(default_id) or CourseRef(default_id, '', '')
+
+
+def scan_course(course_id, now=None):
+    """Course a scan counts for: an explicit course_id (None if unknown), else the course in session at `now`."""
+    if course_id:
+        return get_course(int(course_id)) if str(course_id).isdigit() else None
+    return current_course(now)
+
+
+def report_source():
+    """Pick the database a report reads from; return (db_path, freshness).
+
+    freshness is None for live reads, otherwise a dict describing the snapshot.
+    Falls back to the live database when no snapshot exists yet.
+    """
+    source = request.args.get('source', REPORT_SOURCE)
+    info = snapshot_info() if source == 'snapshot' else None
+    if not info:
+        return None, None
+    from datetime import datetime
+    path, taken_at, age = info
+    return path, {
+        'taken_at': datetime.fromtimestamp(taken_at).strftime('%Y-%m-%d %H:%M:%S'),
+        'age_seconds': int(age)
+    }
+
 @app.route('/check', methods=['GET'])
 def check():
     """Handle QR code scan result and display student info."""
@@ -58,67 +186,52 @@ def check():
     if not qr_code:
         return render_template('check.html', error='No QR code provided', student=None)
     
-    # Try to parse JSON QR code format (from student.html)
-    student_id_to_find = None
-    try:
-        import json
-        qr_data = json.loads(qr_code)
-        student_id_to_find = qr_data.get('idno')
-        print(f"DEBUG: Parsed JSON QR, extracted student ID: {student_id_to_find}")
-    except:
-        # Not JSON, use as-is
-        student_id_to_find = qr_code
-        print(f"DEBUG: QR code is not JSON, using as-is: {student_id_to_find}")
+    # Signed payloads are verified here so forged codes never reach the DB
+    student_id_to_find = scanned_student_id(qr_code)
+    print(f"DEBUG: Parsed QR, extracted student ID: {student_id_to_find}")
+    if student_id_to_find is None:
+        return render_template('check.html', error='Invalid QR code', qr_code=qr_code, student=None)
     
     # Look up student by student_id (not qr_code field)
-    conn = sqlite3.connect('attendance.db')
-    cur = conn.cursor()
-    cur.execute(
-        'SELECT id, student_id, name, last_name, first_name, email, course, level, photo FROM students WHERE student_id = ?',
-        (student_id_to_find,)
-    )
-    row = cur.fetchone()
+    row = get_student_detail(student_id_to_find)
 
+    course = current_course()
     already_present = False
     if row:
-        # Check if attendance already recorded today for this student
+        conn = connect()
+        cur = conn.cursor()
+        # Check if attendance already recorded today for this student in this course;
+        # a UTC range on check_in_time is answered from idx_attendance_student_course
         cur.execute(
             """
             SELECT id FROM attendance
-            WHERE student_id = ? AND date(check_in_time) = date('now','localtime')
+            WHERE student_id = ? AND course_id = ?
+              AND check_in_time >= datetime('now', 'localtime', 'start of day', 'utc')
+              AND check_in_time < datetime('now', 'localtime', 'start of day', '+1 day', 'utc')
             LIMIT 1
             """,
-            (row[0],)
+            (row.id, course.id)
         )
         if cur.fetchone():
             already_present = True
-    conn.close()
+        conn.close()
     
     print(f"DEBUG: Database returned: {row}")
     
     if row:
-        student_id = row[0]
-        course_id = DEFAULT_COURSE_ID
-        # Record attendance only if not already present today
-        if already_present:
+        # Record attendance only if enrolled and not already present today
+        if not is_enrolled(course.id, row.id):
+            success = False
+            error_msg = f'This student is not enrolled in {course.course_name or course.course_code}'
+        elif already_present:
             success = False
             error_msg = 'This student is already present'
         else:
-            success = record_attendance(student_id, course_id, qr_code)
+            success = record_attendance(row.id, course.id, qr_code)
             error_msg = None if success else 'Failed to record attendance'
         
-        student_data = {
-            'id': row[0],
-            'student_id': row[1],
-            'name': row[2],
-            'last_name': row[3] or '',
-            'first_name': row[4] or '',
-            'email': row[5] or '',
-            'course': row[6] or '',
-            'level': row[7] or '',
-            'photo': row[8] or '',
-            'qr_code': qr_code
-        }
+        student_data = row._asdict()
+        student_data['qr_code'] = qr_code
         print(f"DEBUG: Passing student data: {student_data}")
         
         return render_template('check.html', student=student_data, success=success, error=error_msg)
@@ -134,8 +247,9 @@ def login():
         admin = get_admin(email, password)
         
         if admin:
-            session['admin_id'] = admin[0]
-            session['admin_name'] = admin[1]
+            session['admin_id'] = admin.id
+            session['admin_name'] = admin.name
+            session['campus'] = current_campus()
             return redirect(url_for('admin_panel'))
         else:
             return render_template('AdminLogin.html', error='Invalid credentials')
@@ -143,6 +257,7 @@ def login():
     return render_template('AdminLogin.html')
 
 @app.route('/admin', methods=['GET'])
+@cached_response(('admins',), vary_session=('admin_name',))
 def admin_panel():
     auth = require_admin()
     if auth:
@@ -151,7 +266,7 @@ def admin_panel():
     # Load admins from attendance.db via helper and render admin page
     rows = get_all_admins()
     users = [
-        { 'id': r[0], 'name': r[1], 'email': r[2], 'password': '••••••' }
+        { 'id': r.id, 'name': r.name, 'email': r.email, 'password': '••••••' }
         for r in rows
     ]
     return render_template('admin.html', users=users, admin_name=session.get('admin_name'), error=error_msg)
@@ -164,20 +279,72 @@ def admin_users_get():
         return auth
     return redirect(url_for('admin_panel'))
 
+def scan_payload(student, course_id):
+    """Success response for a recorded scan."""
+    return {
+        'status': 'success',
+        'message': f'Attendance recorded for {student.name}',
+        'student_name': student.name,
+        'student_id': student.student_id,
+        'course_id': course_id
+    }
+
+def retried_scan_payload(row, student, course_id):
+    """Payload for a retry of the scan stored as `row`, or None if the scan_id belongs to another scan.
+
+    The course in session may have changed since the first attempt, so the
+    course is only compared when the client named one; the stored course is replayed.
+    """
+    if row.student_id != student.id or (course_id and str(course_id) != str(row.course_id)):
+        return None
+    return scan_payload(student, row.course_id)
+
+def replay_scan(scan_id, qr_code_raw, row, student, course_id):
+    """/scan-qr response for a scan_id that is already recorded."""
+    payload = retried_scan_payload(row, student, course_id)
+    if payload is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'scan_id was already used for a different scan'
+        }), 409
+    remember_response(scan_id, qr_code_raw, payload, 200)
+    response = jsonify(payload)
+    response.headers[REPLAY_HEADER] = 'true'
+    return response, 200
+
 @app.route('/scan-qr', methods=['POST'])
 def scan_qr():
     """Handle QR code scan and record attendance."""
     data = request.get_json()
-    qr_code_raw = data.get('qr_code', '')
-    course_id = data.get('course_id', 1)  # Default to course 1
+    qr_code_raw = str(data.get('qr_code') or '')
+    course_id = data.get('course_id')
+    # Retries of a tagged scan are answered with the original response
+    scan_id = data.get('scan_id') or request.headers.get(IDEMPOTENCY_HEADER)
+    if scan_id:
+        scan_id = normalize_scan_id(scan_id)
+        if not scan_id:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid scan_id'
+            }), 400
+        cached = lookup_response(scan_id)
+        if cached:
+            cached_qr, payload, status = cached
+            if cached_qr != qr_code_raw:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'scan_id was already used for a different QR code'
+                }), 409
+            response = jsonify(payload)
+            response.headers[REPLAY_HEADER] = 'true'
+            return response, status
     # Align scan payload parsing with /check
-    student_lookup_val = qr_code_raw
-    try:
-        import json
-        qr_data = json.loads(qr_code_raw)
-        student_lookup_val = qr_data.get('idno', qr_code_raw)
-    except Exception:
-        pass
+    student_lookup_val = scanned_student_id(qr_code_raw)
+    if student_lookup_val is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid QR code'
+        }), 400
 
     student = get_student_by_qr(student_lookup_val)
     
@@ -187,22 +354,185 @@ def scan_qr():
             'message': 'Student not found'
         }), 404
 
-    student_id = student[0]
-    course_id_to_use = course_id or DEFAULT_COURSE_ID
-    if record_attendance(student_id, course_id_to_use, qr_code_raw):
+    # A retry that missed the response cache is answered from the stored row,
+    # before the course in session (which may have changed since) is looked up
+    row = get_scan(scan_id) if scan_id else None
+    if row:
+        return replay_scan(scan_id, qr_code_raw, row, student, course_id)
+
+    # An explicit course must exist; otherwise use the course in session now
+    course = scan_course(course_id)
+    if not course:
         return jsonify({
-            'status': 'success',
-            'message': f'Attendance recorded for {student[2]}',
-            'student_name': student[2],
-            'student_id': student[1]
-        }), 200
+            'status': 'error',
+            'message': 'Unknown course'
+        }), 400
+    if not is_enrolled(course.id, student.id):
+        return jsonify({
+            'status': 'error',
+            'message': f'{student.name} is not enrolled in {course.course_name or course.course_code}'
+        }), 403
+    payload = scan_payload(student, course.id)
+    if scan_id:
+        result = record_scan(student.id, course.id, qr_code_raw, scan_id)
+        if result:
+            row, created = result
+            if row and not created:
+                # Recorded by a concurrent attempt with the same scan_id
+                return replay_scan(scan_id, qr_code_raw, row, student, course_id)
+            remember_response(scan_id, qr_code_raw, payload, 200)
+            return jsonify(payload), 200
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to record attendance'
+        }), 500
+    if record_attendance(student.id, course.id, qr_code_raw):
+        return jsonify(payload), 200
     else:
         return jsonify({
             'status': 'error',
             'message': 'Failed to record attendance'
         }), 500
 
+def require_kiosk():
+    """Reject /kiosk/* requests without the configured KIOSK_TOKEN.
+
+    The roster exposes every student's IDNO and name, so kiosk endpoints are
+    refused outright until a token is configured.
+    """
+    if not KIOSK_TOKEN:
+        return jsonify({'success': False, 'message': 'Kiosk mode is not configured'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Kiosk-Token', ''), KIOSK_TOKEN):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    return None
+
+@app.route('/kiosk/roster', methods=['GET'])
+def kiosk_roster():
+    """Versioned roster for offline kiosks; ?since=<version> returns only the changes."""
+    auth = require_kiosk()
+    if auth:
+        return auth
+    since = request.args.get('since', 0, type=int)
+    version, body = roster_json(max(since, 0))
+    response = Response(body, mimetype='application/json')
+    response.set_etag(f'roster-{version}-{since}')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def scan_error(scan_id, code, message):
+    return {'scan_id': scan_id, 'code': code, 'status': 'error', 'message': message}
+
+def apply_kiosk_scans(scans):
+    """Validate queued kiosk scans and record the accepted ones in one transaction.
+
+    Each scan is {scan_id, qr_code, scanned_at (epoch ms), course_id (optional)}.
+    Returns one result per scan, in order: the /scan-qr payload plus scan_id
+    and an HTTP-style code. Scans already applied are answered as before.
+    """
+    from datetime import datetime
+    now = time.time()
+    results = [None] * len(scans)
+    pending = []
+    for i, scan in enumerate(scans):
+        scan = scan if isinstance(scan, dict) else {}
+        qr_code_raw = str(scan.get('qr_code') or '')
+        scan_id = normalize_scan_id(scan.get('scan_id'))
+        if not scan_id:
+            results[i] = scan_error(scan.get('scan_id'), 400, 'Invalid scan_id')
+            continue
+        cached = lookup_response(scan_id)
+        if cached:
+            cached_qr, payload, status = cached
+            if cached_qr == qr_code_raw:
+                results[i] = dict(payload, scan_id=scan_id, code=status)
+            else:
+                results[i] = scan_error(scan_id, 409, 'scan_id was already used for a different QR code')
+            continue
+        try:
+            scanned_at = float(scan['scanned_at']) / 1000 if scan.get('scanned_at') is not None else now
+        except (TypeError, ValueError):
+            scanned_at = None
+        if scanned_at is None or not math.isfinite(scanned_at):
+            results[i] = scan_error(scan_id, 400, 'Invalid scanned_at')
+            continue
+        # A kiosk clock running ahead is trusted up to KIOSK_CLOCK_SKEW
+        if scanned_at > now + KIOSK_CLOCK_SKEW:
+            scanned_at = now
+        if now - scanned_at > KIOSK_MAX_SCAN_AGE:
+            results[i] = scan_error(scan_id, 422, 'Scan is too old to apply')
+            continue
+        student_lookup_val = scanned_student_id(qr_code_raw)
+        if student_lookup_val is None:
+            results[i] = scan_error(scan_id, 400, 'Invalid QR code')
+            continue
+        pending.append((i, scan_id, qr_code_raw, scanned_at, student_lookup_val, scan.get('course_id')))
+
+    students = get_students_by_qr({p[4] for p in pending})
+    accepted = []
+    rows = []
+    for i, scan_id, qr_code_raw, scanned_at, student_lookup_val, course_id in pending:
+        student = students.get(student_lookup_val)
+        if not student:
+            results[i] = scan_error(scan_id, 404, 'Student not found')
+            continue
+        # Offline scans count for the course that was in session when they were taken
+        course = scan_course(course_id, datetime.fromtimestamp(min(scanned_at, now)))
+        if not course:
+            results[i] = scan_error(scan_id, 400, 'Unknown course')
+            continue
+        if not is_enrolled(course.id, student.id):
+            results[i] = scan_error(
+                scan_id, 403, f'{student.name} is not enrolled in {course.course_name or course.course_code}'
+            )
+            continue
+        payload = scan_payload(student, course.id)
+        check_in_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(scanned_at))
+        rows.append((student.id, course.id, qr_code_raw, scan_id, check_in_time))
+        accepted.append((i, scan_id, qr_code_raw, student, course_id, payload))
+
+    recorded = record_scans(rows) if rows else {}
+    for i, scan_id, qr_code_raw, student, course_id, payload in accepted:
+        if recorded is None:
+            results[i] = scan_error(scan_id, 500, 'Failed to record attendance')
+            continue
+        row, created = recorded.get(scan_id, (None, False))
+        if row and not created:
+            payload = retried_scan_payload(row, student, course_id)
+            if payload is None:
+                results[i] = scan_error(scan_id, 409, 'scan_id was already used for a different scan')
+                continue
+        remember_response(scan_id, qr_code_raw, payload, 200)
+        results[i] = dict(payload, scan_id=scan_id, code=200)
+    return results
+
+@app.route('/kiosk/sync', methods=['POST'])
+def kiosk_sync():
+    """Apply a batch of scans queued by an offline kiosk."""
+    auth = require_kiosk()
+    if auth:
+        return auth
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans')
+    if not isinstance(scans, list) or not scans:
+        return jsonify({'success': False, 'message': 'scans must be a non-empty list'}), 400
+    if len(scans) > KIOSK_SYNC_BATCH:
+        return jsonify({'success': False, 'message': f'At most {KIOSK_SYNC_BATCH} scans per request'}), 413
+    return jsonify({'success': True, 'results': apply_kiosk_scans(scans)})
+
+@app.route('/qr-code.svg', methods=['GET'])
+def qr_code_svg():
+    """Render the signed QR payload for a student IDNO as an SVG image."""
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    idno = request.args.get('idno', '').strip()
+    if not idno:
+        return jsonify({'success': False, 'message': 'IDNO is required'}), 400
+    out = io.BytesIO()
+    segno.make(encode_payload(idno), error='m').save(out, kind='svg', scale=4, border=2)
+    return Response(out.getvalue(), mimetype='image/svg+xml')
+
 @app.route('/courses', methods=['GET'])
+@cached_response(('courses',))
 def get_courses():
     """Get all courses as JSON."""
     if 'admin_id' not in session:
@@ -210,6 +540,68 @@ def get_courses():
     courses = get_all_courses()
     return jsonify(courses)
 
+@app.route('/courses/<int:course_id>/enrollment', methods=['POST'])
+def bulk_enroll(course_id):
+    """Enroll many students at once from a JSON list or a CSV of IDNOs."""
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    if request.is_json:
+        idnos = (request.get_json(silent=True) or {}).get('student_ids') or []
+        if not isinstance(idnos, list):
+            return jsonify({'success': False, 'message': 'student_ids must be a list'}), 400
+    elif 'file' in request.files:
+        idnos = parse_student_ids_csv(request.files['file'].read().decode('utf-8-sig'))
+    else:
+        idnos = parse_student_ids_csv(request.get_data(as_text=True))
+    if not idnos:
+        return jsonify({'success': False, 'message': 'No student IDs provided'}), 400
+
+    result = bulk_enroll_students(course_id, idnos)
+    if result is None:
+        return jsonify({'success': False, 'message': 'Course not found'}), 404
+    invalidate_rosters()
+    return jsonify({'success': True, **result})
+
+@app.route('/courses/<int:course_id>/analytics', methods=['GET'])
+def course_analytics(course_id):
+    """Per-student lateness, absence streaks and at-risk flags for a course over a term.
+
+    The term is ?start=&end= (YYYY-MM-DD), or ?term= naming an archived term;
+    by default the last 16 weeks up to today.
+    """
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    from datetime import date, timedelta
+    term = request.args.get('term', '').strip()
+    try:
+        if term:
+            match = [a for a in list_archives() if a[0] == term]
+            if not match:
+                return jsonify({'success': False, 'message': 'Unknown term'}), 404
+            start, end = date.fromisoformat(match[0][2]), date.fromisoformat(match[0][3])
+        else:
+            end_arg = request.args.get('end', '').strip()
+            start_arg = request.args.get('start', '').strip()
+            end = date.fromisoformat(end_arg) if end_arg else date.today()
+            start = date.fromisoformat(start_arg) if start_arg else end - timedelta(weeks=16)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'success': False, 'message': 'start must not be after end'}), 400
+    if start < ANALYTICS_MIN_DATE or end > date.today() + timedelta(days=366):
+        return jsonify({'success': False, 'message': 'Dates are out of range'}), 400
+    if (end - start).days > ANALYTICS_MAX_TERM_DAYS:
+        return jsonify({
+            'success': False,
+            'message': f'The range may span at most {ANALYTICS_MAX_TERM_DAYS} days'
+        }), 400
+
+    result = get_course_analytics(course_id, start, end)
+    if result is None:
+        return jsonify({'success': False, 'message': 'Course not found'}), 404
+    return Response(result[3], mimetype='application/json')
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -222,7 +614,14 @@ def student_management():
         return auth
     return render_template('studentmngt.html')
 
+def attendance_cache_key():
+    """/attendance defaults to today, and snapshot reads change when a new snapshot lands."""
+    from datetime import datetime
+    info = snapshot_info() if request.args.get('source', REPORT_SOURCE) == 'snapshot' else None
+    return datetime.now().strftime('%Y-%m-%d'), info[1] if info else None
+
 @app.route('/attendance')
+@cached_response(('attendance', 'students', 'attendance_archives'), extra_key=attendance_cache_key)
 def view_attendance():
     """Display attendance records, defaults to today. Can filter by date (YYYY-MM-DD)."""
     auth = require_admin()
@@ -234,50 +633,41 @@ def view_attendance():
     if not selected_date:
         selected_date = datetime.now().strftime('%Y-%m-%d')
 
-    conn = sqlite3.connect('attendance.db')
-    cur = conn.cursor()
-
-    base_query = '''
-        SELECT 
-            s.student_id,
-            s.last_name,
-            s.first_name,
-            s.course,
-            s.level,
-            strftime('%Y-%m-%d', a.check_in_time, 'localtime') as date_in,
-            strftime('%I:%M %p', a.check_in_time, 'localtime') as time_in
-        FROM attendance a
-        JOIN students s ON a.student_id = s.id
-    '''
-
-    # Build a start/end window for the chosen date to avoid timezone/date() quirks
-    start_ts = f"{selected_date} 00:00:00"
-    end_ts = f"{selected_date} 23:59:59"
-    where_clause = (
-        "WHERE datetime(a.check_in_time, 'localtime') BETWEEN datetime(?, 'localtime') "
-        "AND datetime(?, 'localtime')"
-    )
-    params = [start_ts, end_ts]
-    order_limit = 'ORDER BY a.check_in_time DESC LIMIT 50'
-
-    cur.execute(' '.join([base_query, where_clause, order_limit]).strip(), params)
-    rows = cur.fetchall()
-    conn.close()
-    
-    attendance_records = [
-        {
-            'student_id': r[0],
-            'last_name': r[1] or '',
-            'first_name': r[2] or '',
-            'course': r[3] or '',
-            'level': r[4] or '',
-            'date_in': r[5] or '',
-            'time_in': r[6] or ''
-        }
-        for r in rows
-    ]
+    # Spans archived terms transparently when the date falls inside one
+    db_path, snapshot = report_source()
+    rows = get_attendance_report(selected_date, selected_date, limit=50, db_path=db_path)
     
-    return render_template('attendance.html', attendance_records=attendance_records, selected_date=selected_date)
+    # Records expose fields by name, so the template can use them directly
+    return render_template('attendance.html', attendance_records=rows,
+                           selected_date=selected_date, snapshot=snapshot)
+
+@app.route('/attendance/export')
+def export_attendance():
+    """Download attendance as CSV for a local date range (start..end, YYYY-MM-DD)."""
+    auth = require_admin()
+    if auth:
+        return auth
+    from datetime import datetime
+    today = datetime.now().strftime('%Y-%m-%d')
+    start_date = request.args.get('start', '').strip() or today
+    end_date = request.args.get('end', '').strip() or start_date
+    try:
+        datetime.strptime(start_date, '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+
+    db_path, snapshot = report_source()
+    rows = get_attendance_report(start_date, end_date, db_path=db_path)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['student_id', 'last_name', 'first_name', 'course', 'level', 'date_in', 'time_in'])
+    writer.writerows(rows)
+    headers = {'Content-Disposition': f'attachment; filename=attendance_{start_date}_{end_date}.csv'}
+    if snapshot:
+        headers['X-Snapshot-Taken-At'] = snapshot['taken_at']
+        headers['X-Snapshot-Age'] = str(snapshot['age_seconds'])
+    return Response(out.getvalue(), mimetype='text/csv', headers=headers)
 
 @app.route('/student')
 def student_page():
@@ -310,7 +700,7 @@ def add_student():
 
     conn = None
     try:
-        conn = sqlite3.connect('attendance.db')
+        conn = connect()
         cur = conn.cursor()
         full_name = f"{firstname} {lastname}".strip()
 
@@ -375,31 +765,15 @@ def add_student():
             conn.close()
 
 @app.route('/students', methods=['GET'])
+@cached_response(('students',))
 def list_students():
     """Get all students for display."""
     if 'admin_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    conn = sqlite3.connect('attendance.db')
-    cur = conn.cursor()
     # Include photo so the management page can preview it
-    cur.execute('SELECT id, student_id, last_name, first_name, course, level, photo FROM students')
-    rows = cur.fetchall()
-    conn.close()
-    
-    students = [
-        {
-            'id': r[0],
-            'student_id': r[1],
-            'last_name': r[2],
-            'first_name': r[3],
-            'course': r[4],
-            'level': r[5],
-            'photo': r[6] or ''
-        }
-        for r in rows
-    ]
-    return jsonify({'success': True, 'students': students})
+    students = get_all_students()
+    return Response(records_json(students, 'students', success=True), mimetype='application/json')
 
 @app.route('/students/<int:student_id>', methods=['GET'])
 def get_student(student_id):
@@ -407,25 +781,10 @@ def get_student(student_id):
     if 'admin_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    conn = sqlite3.connect('attendance.db')
-    cur = conn.cursor()
-    cur.execute('SELECT id, student_id, last_name, first_name, course, level, photo FROM students WHERE id = ?', (student_id,))
-    row = cur.fetchone()
-    conn.close()
-    
-    if not row:
+    student = get_student_row(student_id)
+    if not student:
         return jsonify({'success': False, 'message': 'Student not found'}), 404
-    
-    student = {
-        'id': row[0],
-        'student_id': row[1],
-        'last_name': row[2],
-        'first_name': row[3],
-        'course': row[4],
-        'level': row[5],
-        'photo': row[6] or ''
-    }
-    return jsonify({'success': True, 'student': student})
+    return jsonify({'success': True, 'student': student._asdict()})
 
 @app.route('/students/<int:student_id>', methods=['DELETE'])
 def delete_student(student_id):
@@ -435,7 +794,7 @@ def delete_student(student_id):
     
     conn = None
     try:
-        conn = sqlite3.connect('attendance.db')
+        conn = connect()
         cur = conn.cursor()
         cur.execute('DELETE FROM students WHERE id = ?', (student_id,))
         conn.commit()
@@ -471,7 +830,7 @@ def update_student(student_id):
 
     conn = None
     try:
-        conn = sqlite3.connect('attendance.db')
+        conn = connect()
         cur = conn.cursor()
         full_name = f"{firstname} {lastname}".strip()
 
@@ -535,12 +894,12 @@ def add_user():
     email = request.form.get('email', '').strip()
     password = request.form.get('password', '').strip()
     if not name or not email or not password:
-        return redirect('/admin')
+        return redirect(url_for('admin_panel'))
     # insert into admins via helper
     ok = add_admin(email, password, name)
     if not ok:
-        return redirect('/admin?error=Email+already+exists')
-    return redirect('/admin')
+        return redirect(url_for('admin_panel', error='Email already exists'))
+    return redirect(url_for('admin_panel'))
 
 @app.route('/admin/users/<int:user_id>/delete', methods=['POST'])
 def delete_user(user_id):
@@ -548,7 +907,7 @@ def delete_user(user_id):
     if auth:
         return auth
     delete_admin(user_id)
-    return redirect('/admin')
+    return redirect(url_for('admin_panel'))
 
 @app.route('/admin/users/<int:user_id>/edit', methods=['GET'])
 def edit_user_page(user_id):
@@ -557,8 +916,8 @@ def edit_user_page(user_id):
         return auth
     row = get_admin_by_id(user_id)
     if not row:
-        return redirect('/admin')
-    user = { 'id': row[0], 'name': row[1], 'email': row[2], 'password': '' }
+        return redirect(url_for('admin_panel'))
+    user = { 'id': row.id, 'name': row.name, 'email': row.email, 'password': '' }
     return render_template('edit_user.html', user=user)
 
 @app.route('/admin/users/<int:user_id>/edit', methods=['POST'])
@@ -570,12 +929,12 @@ def edit_user_submit(user_id):
     email = request.form.get('email', '').strip()
     password = request.form.get('password', '').strip()
     if not name or not email:
-        return redirect(f'/admin/users/{user_id}/edit')
+        return redirect(url_for('edit_user_page', user_id=user_id))
     try:
         update_admin(user_id, name, email, password if password else None)
     except Exception:
         pass
-    return redirect('/admin')
+    return redirect(url_for('admin_panel'))
 
 # (update route removed to restore previous behavior)
 
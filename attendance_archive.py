@@ -0,0 +1,231 @@
+"""
+Term-based archival of the attendance table.
+
+Closed terms are moved out of the hot ``attendance`` table into one SQLite
+file per term (``archive/attendance_<term>.db``). The ``attendance_archives``
+catalog in the main database records which dates each file covers, so
+reporting queries attach only the archives that overlap the requested range
+and read them together with the hot table via UNION ALL. Campus shards
+other than the default database archive into a subdirectory of ARCHIVE_DIR
+named after their database file.
+
+Usage:
+    python attendance_archive.py archive 2025-1 2025-01-06 2025-05-24
+    python attendance_archive.py list
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+from datetime import date, timedelta
+
+from DB_HELPER import DB_PATH, connect, db_path
+from records import AttendanceReportRow, ScanRow, fetch_records
+
+ARCHIVE_DIR = os.environ.get(
+    'ATTENDANCE_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'archive')
+)
+
+_TERM_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Local dates start..end (inclusive) as a UTC range on the raw check_in_time,
+# so idx_attendance_checkin can serve it. Shared by archival and reporting so
+# a row always lands in (and is found in) the term its local date belongs to.
+_LOCAL_DATE_RANGE = "{col} >= datetime(?, 'utc') AND {col} < datetime(?, '+1 day', 'utc')"
+
+_REPORT_COLUMNS = '''
+    s.student_id,
+    COALESCE(s.last_name, ''),
+    COALESCE(s.first_name, ''),
+    COALESCE(s.course, ''),
+    COALESCE(s.level, ''),
+    COALESCE(strftime('%Y-%m-%d', a.check_in_time, 'localtime'), '') as date_in,
+    COALESCE(strftime('%I:%M %p', a.check_in_time, 'localtime'), '') as time_in
+'''
+
+
+def archive_dir():
+    """Return the directory holding the active database's term archives."""
+    path = os.path.abspath(db_path())
+    if path == os.path.abspath(DB_PATH):
+        return ARCHIVE_DIR
+    return os.path.join(ARCHIVE_DIR, os.path.splitext(os.path.basename(path))[0])
+
+
+def archive_path(term):
+    """Return the archive database file used for a term."""
+    return os.path.join(archive_dir(), f'attendance_{term}.db')
+
+
+def archive_term(term, start_date, end_date):
+    """Move attendance rows dated start_date..end_date (local, inclusive) into the term archive.
+
+    Returns the number of rows moved. Re-running for the same term appends
+    to its archive and widens the catalogued date range.
+    """
+    if not _TERM_RE.match(term):
+        raise ValueError('term may only contain letters, digits, "-" and "_"')
+    if start_date > end_date:
+        raise ValueError('start_date must not be after end_date')
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    path = archive_path(term)
+    conn = connect()
+    c = conn.cursor()
+    try:
+        c.execute('ATTACH DATABASE ? AS arch', (path,))
+        c.execute('''CREATE TABLE IF NOT EXISTS arch.attendance (
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            check_in_time TIMESTAMP,
+            qr_code_scanned TEXT,
+            scan_id TEXT
+        )''')
+        # Archives written before scan ids were kept gain the column on the next run
+        columns = {row[1] for row in c.execute('PRAGMA arch.table_info(attendance)')}
+        if 'scan_id' not in columns:
+            c.execute('ALTER TABLE arch.attendance ADD COLUMN scan_id TEXT')
+        c.execute('CREATE INDEX IF NOT EXISTS arch.idx_attendance_checkin ON attendance(check_in_time)')
+        c.execute('''CREATE INDEX IF NOT EXISTS arch.idx_attendance_scan_id
+                     ON attendance(scan_id) WHERE scan_id IS NOT NULL''')
+
+        where = 'WHERE ' + _LOCAL_DATE_RANGE.format(col='check_in_time')
+        c.execute('BEGIN IMMEDIATE')
+        c.execute(f'''INSERT OR IGNORE INTO arch.attendance
+                      (id, student_id, course_id, check_in_time, qr_code_scanned, scan_id)
+                      SELECT id, student_id, course_id, check_in_time, qr_code_scanned, scan_id
+                      FROM main.attendance {where}''', (start_date, end_date))
+        c.execute(f'DELETE FROM main.attendance {where}', (start_date, end_date))
+        moved = c.rowcount
+        c.execute('''INSERT INTO attendance_archives (term, path, start_date, end_date, row_count)
+                     VALUES (?, ?, ?, ?, ?)
+                     ON CONFLICT(term) DO UPDATE SET
+                         start_date = min(start_date, excluded.start_date),
+                         end_date = max(end_date, excluded.end_date),
+                         row_count = row_count + excluded.row_count,
+                         archived_at = CURRENT_TIMESTAMP''',
+                  (term, path, start_date, end_date, moved))
+        conn.commit()
+        return moved
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def list_archives():
+    """Return (term, path, start_date, end_date, row_count, archived_at) for every archived term."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('''SELECT term, path, start_date, end_date, row_count, archived_at
+                 FROM attendance_archives ORDER BY start_date''')
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def attach_archives(conn, start_date, end_date):
+    """Attach archives overlapping start_date..end_date to conn.
+
+    Returns the attendance table references to UNION over, hot table first.
+    """
+    c = conn.cursor()
+    c.execute('''SELECT path FROM attendance_archives
+                 WHERE start_date <= ? AND end_date >= ?
+                 ORDER BY start_date''', (end_date, start_date))
+    tables = ['main.attendance']
+    for i, (path,) in enumerate(c.fetchall()):
+        if not os.path.exists(path):
+            continue
+        alias = f'arch_{i}'
+        c.execute(f'ATTACH DATABASE ? AS {alias}', (path,))
+        tables.append(f'{alias}.attendance')
+    return tables
+
+
+def archived_scans(conn, scan_ids, since=None):
+    """Return {scan_id: ScanRow} for scan_ids already moved into an archive.
+
+    Only archives covering local dates from `since` (a UTC check_in_time,
+    default now) onwards are searched, so a kiosk replay of a scan whose
+    term has since been archived is not recorded again. Must be called
+    outside a transaction; the archives are detached again before returning.
+    """
+    # The catalog holds local dates; a day's margin covers any UTC offset
+    first = date.fromisoformat(since[:10]) if since else date.today()
+    start = (first - timedelta(days=1)).isoformat()
+    found = {}
+    c = conn.cursor()
+    for table in attach_archives(conn, start, '9999-12-31')[1:]:
+        alias = table.split('.')[0]
+        columns = {row[1] for row in c.execute(f'PRAGMA {alias}.table_info(attendance)')}
+        if 'scan_id' in columns:
+            c.execute(f'''SELECT scan_id, id, student_id, course_id, check_in_time FROM {table}
+                          WHERE scan_id IN (SELECT value FROM json_each(?))''', (json.dumps(scan_ids),))
+            found.update((row[0], ScanRow._make(row[1:])) for row in c.fetchall())
+        c.execute(f'DETACH DATABASE {alias}')
+    return found
+
+
+def attendance_union(tables):
+    """Build a subquery selecting attendance rows from every table reference."""
+    if len(tables) == 1:
+        return tables[0]
+    parts = [
+        f'SELECT id, student_id, course_id, check_in_time, qr_code_scanned FROM {t}'
+        for t in tables
+    ]
+    return '(' + ' UNION ALL '.join(parts) + ')'
+
+
+def get_attendance_report(start_date, end_date, limit=None, db_path=None):
+    """Return AttendanceReportRow records for local dates start_date..end_date, newest first, spanning archives.
+
+    db_path lets reports read from a snapshot instead of the live database.
+    """
+    # Snapshots are replaced on disk, so they get a fresh (unpooled) connection
+    conn = sqlite3.connect(db_path) if db_path else connect()
+    try:
+        source = attendance_union(attach_archives(conn, start_date, end_date))
+        query = f'''
+            SELECT {_REPORT_COLUMNS}
+            FROM {source} a
+            JOIN students s ON a.student_id = s.id
+            WHERE {_LOCAL_DATE_RANGE.format(col='a.check_in_time')}
+            ORDER BY a.check_in_time DESC
+        '''
+        params = [start_date, end_date]
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        c = conn.cursor()
+        c.execute(query, params)
+        return fetch_records(c, AttendanceReportRow)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive closed terms out of the attendance table.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_archive = sub.add_parser('archive', help='move a term into its archive database')
+    p_archive.add_argument('term')
+    p_archive.add_argument('start_date', help='YYYY-MM-DD (inclusive)')
+    p_archive.add_argument('end_date', help='YYYY-MM-DD (inclusive)')
+    sub.add_parser('list', help='show archived terms')
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        moved = archive_term(args.term, args.start_date, args.end_date)
+        print(f"✓ Archived {moved} attendance rows for term {args.term} -> {archive_path(args.term)}")
+    else:
+        for term, path, start, end, count, archived_at in list_archives():
+            print(f"{term}\t{start}..{end}\t{count} rows\t{path}\t(archived {archived_at})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Latency benchmark for /courses/<id>/analytics.
+
+Builds a throwaway database in a temp directory with N enrolled students
+and 16 weeks of MWF check-ins, then times the endpoint cold (computed) and
+warm (served from the analytics cache).
+
+Usage: python bench_analytics.py [students]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+
+def populate(students, weeks=16):
+    from DB_HELPER import add_admin, add_course, DB_PATH
+    add_admin('bench@example.com', 'bench', 'Bench')
+    add_course('BENCH101', 'Benchmark Course', 'Bench', '08:00 - 09:30 MWF')
+    conn = sqlite3.connect(DB_PATH)
+    course_id = conn.execute("SELECT id FROM courses WHERE course_code = 'BENCH101'").fetchone()[0]
+    conn.executemany('INSERT INTO students (student_id, name, email) VALUES (?, ?, ?)',
+                     ((f'B{i:06d}', f'Student {i}', f'b{i}@example.com') for i in range(students)))
+    conn.execute('''INSERT INTO enrollment (student_id, course_id)
+                    SELECT id, ? FROM students WHERE student_id LIKE 'B%' ''', (course_id,))
+    ids = [r[0] for r in conn.execute("SELECT id FROM students WHERE student_id LIKE 'B%'")]
+
+    rng = random.Random(42)
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(weeks=weeks)
+    rows = []
+    day = start
+    while day <= end:
+        if day.weekday() in (0, 2, 4):
+            for sid in ids:
+                if rng.random() < 0.85:
+                    local = datetime(day.year, day.month, day.day, 7, 50) + timedelta(minutes=rng.randint(0, 40))
+                    # check_in_time is stored in UTC like CURRENT_TIMESTAMP
+                    utc = datetime.utcfromtimestamp(local.timestamp())
+                    rows.append((sid, course_id, utc.strftime('%Y-%m-%d %H:%M:%S')))
+        day += timedelta(days=1)
+    conn.executemany('INSERT INTO attendance (student_id, course_id, check_in_time) VALUES (?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return course_id, start, end, len(rows)
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, here)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.makedirs(os.path.join('static', 'photos'))
+        import app as app_module
+        course_id, start, end, checkins = populate(students)
+        client = app_module.app.test_client()
+        client.post('/login', data={'email': 'bench@example.com', 'password': 'bench'})
+        url = f'/courses/{course_id}/analytics?start={start}&end={end}'
+
+        print(f"{students} students, {checkins} check-ins")
+        for label in ('cold', 'warm', 'warm'):
+            t0 = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - t0) * 1e3
+            data = response.get_json()
+            print(f"{label:<5} {elapsed:8.1f} ms  status={response.status_code} "
+                  f"sessions={data['sessions']} at_risk={data['at_risk']}")
+        os.chdir(here)
+
+
+if __name__ == '__main__':
+    main()
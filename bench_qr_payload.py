@@ -0,0 +1,51 @@
+"""
+Microbenchmark for the QR decode path.
+
+Compares the old json.loads-in-try/except parsing against
+qr_payload.decode_payload for signed, legacy JSON and plain-ID codes.
+
+Usage: python bench_qr_payload.py [iterations]
+"""
+import json
+import sys
+import timeit
+
+import qr_payload
+from qr_payload import decode_payload, encode_payload
+
+
+def legacy_decode(qr_code):
+    """The parsing /check used before signed payloads."""
+    try:
+        qr_data = json.loads(qr_code)
+        return qr_data.get('idno')
+    except Exception:
+        return qr_code
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    samples = {
+        'signed': encode_payload('23745060'),
+        'json': json.dumps({'idno': '23745060', 'lname': 'Veloso', 'fname': 'Jude',
+                            'course': 'BSIT', 'level': '3'}),
+        'plain': '23745060',
+        'forged': encode_payload('23745060')[:-2] + 'AA',
+    }
+    print(f"{'payload':<8} {'len':>4} {'legacy us/op':>13} {'new us/op':>10}")
+    for name, text in samples.items():
+        legacy = timeit.timeit(lambda: legacy_decode(text), number=iterations)
+        new = timeit.timeit(lambda: decode_payload(text), number=iterations)
+        print(f"{name:<8} {len(text):>4} {legacy / iterations * 1e6:>13.3f} "
+              f"{new / iterations * 1e6:>10.3f}")
+
+    # Distinct codes defeat the verification cache and show the cold cost
+    cold = [encode_payload(str(10000000 + i)) for i in range(iterations)]
+    qr_payload._decode_signed.cache_clear()
+    codes = iter(cold)
+    new = timeit.timeit(lambda: decode_payload(next(codes)), number=iterations)
+    print(f"{'cold':<8} {len(cold[0]):>4} {'-':>13} {new / iterations * 1e6:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
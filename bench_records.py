@@ -0,0 +1,101 @@
+"""
+Memory/throughput benchmark for a 100k-row student listing.
+
+Compares the old route code (tuple rows -> dict literals -> jsonify-style
+sorted json.dumps) with StudentRow records + records_json, on a throwaway
+database in a temp directory.
+
+Usage: python bench_records.py [rows]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from records import StudentRow, fetch_records, records_json
+
+QUERY_LEGACY = 'SELECT id, student_id, last_name, first_name, course, level, photo FROM students'
+QUERY_RECORDS = ("SELECT id, student_id, last_name, first_name, course, level, COALESCE(photo, '') "
+                 "FROM students")
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE students (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT UNIQUE NOT NULL,
+        last_name TEXT,
+        first_name TEXT,
+        course TEXT,
+        level TEXT,
+        photo TEXT
+    )''')
+    conn.executemany(
+        'INSERT INTO students (student_id, last_name, first_name, course, level, photo) VALUES (?, ?, ?, ?, ?, ?)',
+        ((str(20000000 + i), f'Last{i}', f'First{i}', 'BSIT', '3rd Year',
+          f'{20000000 + i}_abcdef12.jpg' if i % 3 else None) for i in range(rows))
+    )
+    conn.commit()
+    return conn
+
+
+def legacy(conn):
+    rows = conn.execute(QUERY_LEGACY).fetchall()
+    students = [
+        {
+            'id': r[0],
+            'student_id': r[1],
+            'last_name': r[2],
+            'first_name': r[3],
+            'course': r[4],
+            'level': r[5],
+            'photo': r[6] or ''
+        }
+        for r in rows
+    ]
+    # jsonify sorts keys and uses compact separators outside debug mode
+    return rows, json.dumps({'success': True, 'students': students}, sort_keys=True, separators=(',', ':'))
+
+
+def typed(conn):
+    rows = fetch_records(conn.execute(QUERY_RECORDS), StudentRow)
+    return rows, records_json(rows, 'students', success=True)
+
+
+def measure(fn, conn, repeats=3):
+    """Return (best seconds, peak bytes, bytes held by the rows, body length)."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows, body = fn(conn)
+        best = min(best, time.perf_counter() - start)
+        del rows, body
+    # Memory is measured on a separate run; tracemalloc distorts timings
+    tracemalloc.start()
+    rows, body = fn(conn)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = len(body)
+    del body
+    return best, peak, held - size, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = make_db(os.path.join(tmp, 'bench.db'), count)
+        # Untimed warm-up so both runs read from the page cache
+        legacy(conn)
+        print(f"{count} rows")
+        print(f"{'variant':<8} {'best ms':>9} {'peak MiB':>9} {'rows MiB':>9} {'body KiB':>9}")
+        for name, fn in (('legacy', legacy), ('records', typed)):
+            elapsed, peak, held, size = measure(fn, conn)
+            print(f"{name:<8} {elapsed * 1e3:>9.1f} {peak / 2**20:>9.1f} {held / 2**20:>9.1f} {size / 1024:>9.0f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Bulk enrollment from the command line.
+
+Accepts student IDNOs as arguments or a CSV file. In a CSV, the column headed
+"student_id" or "idno" is used when present, otherwise the first column.
+
+Usage:
+    python bulk_enroll.py PY20420 --csv section_a.csv
+    python bulk_enroll.py 3 23745060 23745062 1001
+"""
+import argparse
+import csv
+import io
+
+from DB_HELPER import bulk_enroll_students, connect
+
+ID_COLUMNS = ('student_id', 'idno')
+
+
+def parse_student_ids_csv(text):
+    """Return the IDNOs listed in CSV text."""
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    for name in ID_COLUMNS:
+        if name in header:
+            col = header.index(name)
+            return [row[col].strip() for row in rows[1:] if len(row) > col and row[col].strip()]
+    return [row[0].strip() for row in rows if row[0].strip()]
+
+
+def resolve_course_id(course):
+    """Accept a numeric course id or a course_code; return the id or None."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute('SELECT id FROM courses WHERE course_code = ? OR id = ? LIMIT 1', (course, course))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enroll many students in a course at once.')
+    parser.add_argument('course', help='course id or course_code')
+    parser.add_argument('student_ids', nargs='*', help='student IDNOs')
+    parser.add_argument('--csv', dest='csv_path', help='CSV file of student IDNOs')
+    args = parser.parse_args()
+
+    idnos = list(args.student_ids)
+    if args.csv_path:
+        with open(args.csv_path, newline='', encoding='utf-8-sig') as f:
+            idnos.extend(parse_student_ids_csv(f.read()))
+    if not idnos:
+        parser.error('no student IDNOs given')
+
+    course_id = resolve_course_id(args.course)
+    result = bulk_enroll_students(course_id, idnos) if course_id else None
+    if result is None:
+        parser.error(f'unknown course: {args.course}')
+
+    print(f"✓ Added {result['added']}, skipped {result['skipped']} already enrolled, "
+          f"{result['unknown']} unknown.")
+    if result['unknown_ids']:
+        print("Unknown IDNOs: " + ', '.join(result['unknown_ids']))
+
+
+if __name__ == '__main__':
+    main()
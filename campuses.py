@@ -0,0 +1,120 @@
+"""
+Per-campus database shards.
+
+Each campus has its own SQLite file, so campuses never wait on each other's
+write lock. A request is routed to a campus by subdomain
+(north.attendance.example.edu) or by path prefix (/campus/north/...);
+anything else is served from the default database, DB_PATH. Pages under a
+path prefix are mounted there (SCRIPT_NAME), so url_for() and
+request.script_root in templates keep links inside the campus.
+
+Campuses are configured with CAMPUS_DATABASES, a comma-separated list of
+name=path pairs:
+
+    CAMPUS_DATABASES="north=/srv/attendance/north.db,south=/srv/attendance/south.db"
+
+The active database is tracked per request (DB_HELPER.use_database), and
+connection pools and in-memory caches are keyed by it. Each campus also has
+its own session cookie (CampusSessionInterface), so an admin can stay logged
+in to several campuses at once. Maintenance scripts
+act on ATTENDANCE_DB; point it at a campus file to run them for that campus.
+"""
+import os
+import re
+
+from flask import g, request, session
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.exceptions import NotFound
+
+from DB_HELPER import DB_PATH, use_database
+
+PATH_PREFIX = '/campus/'
+ENVIRON_KEY = 'attendance.campus'
+
+_NAME_RE = re.compile(r'^[a-z0-9][a-z0-9-]*$')
+
+
+def parse_campuses(spec):
+    """Parse "name=path,name=path" into a {name: absolute path} dict."""
+    campuses = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, sep, path = item.partition('=')
+        name = name.strip().lower()
+        if not sep or not path.strip() or not _NAME_RE.match(name):
+            raise ValueError(f'invalid CAMPUS_DATABASES entry: {item!r}')
+        campuses[name] = os.path.abspath(path.strip())
+    return campuses
+
+
+CAMPUSES = parse_campuses(os.environ.get('CAMPUS_DATABASES', ''))
+
+
+def all_databases():
+    """Database files served by this deployment, default first."""
+    return [DB_PATH] + [path for path in CAMPUSES.values() if path != os.path.abspath(DB_PATH)]
+
+
+def current_campus():
+    """Name of the campus serving the current request, or None for the default database."""
+    return request.environ.get(ENVIRON_KEY)
+
+
+class CampusMiddleware:
+    """WSGI middleware that picks the campus of each request.
+
+    A /campus/<name> prefix is moved from PATH_INFO to SCRIPT_NAME; otherwise
+    the first label of the Host header is matched against the campus names.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        campus = None
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(PATH_PREFIX):
+            name, _, rest = path[len(PATH_PREFIX):].partition('/')
+            if name not in CAMPUSES:
+                return NotFound()(environ, start_response)
+            campus = name
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + PATH_PREFIX + name
+            environ['PATH_INFO'] = '/' + rest
+        else:
+            host = environ.get('HTTP_HOST', '').split(':')[0].lower()
+            label, dot, _ = host.partition('.')
+            if dot and label in CAMPUSES:
+                campus = label
+        environ[ENVIRON_KEY] = campus
+        return self.wsgi_app(environ, start_response)
+
+
+class CampusSessionInterface(SecureCookieSessionInterface):
+    """Signed-cookie sessions with one cookie per campus (session, session_north, ...).
+
+    Path-prefixed campuses share a host, so a single cookie would carry one
+    campus's login into every other campus.
+    """
+
+    def get_cookie_name(self, app):
+        name = super().get_cookie_name(app)
+        campus = current_campus()
+        return f'{name}_{campus}' if campus else name
+
+
+def enter_campus():
+    """before_request hook: activate the campus database for this request."""
+    campus = current_campus()
+    g.campus_db = use_database(CAMPUSES[campus] if campus else DB_PATH)
+    g.campus_db.__enter__()
+    # Cookies are signed with one key; one copied under another campus's name is not a login there
+    if 'admin_id' in session and session.get('campus') != campus:
+        session.clear()
+
+
+def leave_campus(exc=None):
+    """teardown_request hook: restore the previously active database."""
+    campus_db = g.pop('campus_db', None)
+    if campus_db is not None:
+        campus_db.__exit__(None, None, None)
@@ -1,46 +1,183 @@
 """
 Cleanup script to remove large qr_code and photo base64 data from students table.
 Keeps only photo filenames instead of full base64.
+
+Rows are streamed in rowid order a batch at a time and each batch is
+committed separately, so memory stays flat and the write lock is only held
+briefly. Progress is checkpointed to a file after every batch; re-running
+resumes where the last run stopped. Embedded base64 photos are written to
+static/photos/ and replaced by their filename. The database is VACUUMed and
+ANALYZEd at the end.
+
+Usage:
+    python cleanup_db.py [--batch-size N] [--restart] [--skip-vacuum]
 """
-import sqlite3
+import argparse
+import base64
+import binascii
 import json
+import os
+import sqlite3
+import uuid
+
+DB_PATH = os.environ.get('ATTENDANCE_DB', 'attendance.db')
+PHOTOS_DIR = os.path.join('static', 'photos')
+CHECKPOINT_PATH = DB_PATH + '.cleanup.json'
+BATCH_SIZE = 200
+
+_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+# Magic numbers used to recognise raw (header-less) base64 images
+_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG', '.png'),
+    (b'GIF8', '.gif'),
+    (b'RIFF', '.webp'),
+)
+
+
+def load_checkpoint():
+    """Return (last processed students.id, stats so far); (0, None) when starting fresh."""
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            data = json.load(f)
+        return int(data.get('last_id', 0)), data.get('stats')
+    except (OSError, ValueError, AttributeError):
+        return 0, None
+
+
+def save_checkpoint(last_id, stats):
+    tmp_path = CHECKPOINT_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_id': last_id, 'stats': stats}, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def extract_photo(idno, photo_data):
+    """Write an embedded base64 photo to PHOTOS_DIR; return the filename or None."""
+    ext = None
+    encoded = photo_data
+    if photo_data.startswith('data:'):
+        header, _, encoded = photo_data.partition(',')
+        if not header.startswith('data:image') or ';base64' not in header:
+            return None
+        ext = _EXTENSIONS.get(header[5:].split(';', 1)[0], '.jpg')
+    try:
+        photo_bytes = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    if ext is None:
+        ext = next((e for sig, e in _SIGNATURES if photo_bytes.startswith(sig)), None)
+        if ext is None:
+            return None
+
+    os.makedirs(PHOTOS_DIR, exist_ok=True)
+    filename = f"{idno}_{uuid.uuid4().hex[:8]}{ext}"
+    with open(os.path.join(PHOTOS_DIR, filename), 'wb') as f:
+        f.write(photo_bytes)
+    return filename
+
+
+def clean_photo(idno, photo_data):
+    """Return (new_photo_value, extracted) for a students.photo value."""
+    if not photo_data:
+        return None, False
+    # If it's already a filename, keep it
+    if not photo_data.startswith(('data:', '{')) and len(photo_data) < 200:
+        return photo_data, False
+    # JSON blobs were QR payloads stored in the wrong column; drop them
+    if photo_data.startswith('{'):
+        return None, False
+    filename = extract_photo(idno, photo_data)
+    return filename, filename is not None
 
-DB_PATH = 'attendance.db'
 
-def cleanup_students_table():
+def db_stats(c):
+    c.execute('PRAGMA page_count')
+    pages = c.fetchone()[0]
+    c.execute('PRAGMA page_size')
+    page_size = c.fetchone()[0]
+    c.execute('PRAGMA freelist_count')
+    free = c.fetchone()[0]
+    return pages * page_size, free
+
+
+def cleanup_students_table(batch_size=BATCH_SIZE, restart=False, vacuum=True):
+    if restart and os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    last_id, saved_stats = load_checkpoint()
+
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    
-    # Get all students with their photo data
-    c.execute('SELECT id, photo FROM students')
-    rows = c.fetchall()
-    
-    print(f"Found {len(rows)} students. Cleaning up...")
-    
-    for student_id, photo_data in rows:
-        # Extract filename if photo_data is a data URL or base64
-        photo_filename = None
-        if photo_data:
-            # If it's a data URL, extract nothing (we'll regenerate QR)
-            if photo_data.startswith('data:'):
-                photo_filename = None
-            # If it's already a filename, keep it
-            elif not photo_data.startswith('{') and len(photo_data) < 200:
-                photo_filename = photo_data
-            # Otherwise it's likely huge base64, discard it
-            else:
-                photo_filename = None
-        
-        # Update: clear qr_code, keep only filename in photo
+    c.execute('SELECT count(*) FROM students WHERE id > ?', (last_id,))
+    remaining = c.fetchone()[0]
+    if last_id:
+        print(f"Resuming after student id {last_id}; {remaining} students left. Cleaning up...")
+    else:
+        print(f"Found {remaining} students. Cleaning up...")
+
+    stats = {'scanned': 0, 'updated': 0, 'extracted': 0, 'dropped': 0}
+    stats.update(saved_stats or {})
+    done_before = stats['scanned']
+    while True:
+        # Only one batch of photo blobs is ever held in memory
         c.execute(
-            'UPDATE students SET qr_code = NULL, photo = ? WHERE id = ?',
-            (photo_filename, student_id)
+            'SELECT id, student_id, qr_code, photo FROM students WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
         )
-    
-    conn.commit()
-    conn.close()
-    print("✓ Cleanup complete! qr_code cleared, photo now stores only filenames.")
+        rows = c.fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, idno, qr_code, photo_data in rows:
+            new_photo, extracted = clean_photo(idno, photo_data)
+            if extracted:
+                stats['extracted'] += 1
+            elif photo_data and new_photo is None:
+                stats['dropped'] += 1
+            if qr_code is not None or new_photo != photo_data:
+                updates.append((new_photo, row_id))
+
+        # Update: clear qr_code, keep only filename in photo
+        c.executemany('UPDATE students SET qr_code = NULL, photo = ? WHERE id = ?', updates)
+        conn.commit()
+
+        last_id = rows[-1][0]
+        stats['scanned'] += len(rows)
+        stats['updated'] += len(updates)
+        save_checkpoint(last_id, stats)
+        print(f"  ...{stats['scanned'] - done_before}/{remaining} (through id {last_id})")
+
+    print(f"✓ Cleanup complete! {stats['updated']} rows updated, "
+          f"{stats['extracted']} photos extracted to {PHOTOS_DIR}, {stats['dropped']} invalid photos dropped.")
     print("✓ QR codes will be regenerated on-the-fly by the app.")
 
+    if vacuum:
+        size_before, free_before = db_stats(c)
+        conn.execute('VACUUM')
+        conn.execute('ANALYZE')
+        size_after, free_after = db_stats(c)
+        print(f"✓ VACUUM/ANALYZE: {size_before / 1024:.0f} KiB ({free_before} free pages) -> "
+              f"{size_after / 1024:.0f} KiB ({free_after} free pages)")
+
+    conn.close()
+    # Finished cleanly; the next run starts from the beginning
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    return stats
+
+
 if __name__ == '__main__':
-    cleanup_students_table()
+    parser = argparse.ArgumentParser(description='Strip base64 blobs from the students table in batches.')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per transaction')
+    parser.add_argument('--restart', action='store_true', help='ignore any saved checkpoint')
+    parser.add_argument('--skip-vacuum', action='store_true', help='do not VACUUM/ANALYZE afterwards')
+    args = parser.parse_args()
+    cleanup_students_table(args.batch_size, args.restart, not args.skip_vacuum)
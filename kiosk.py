@@ -0,0 +1,119 @@
+"""
+Roster snapshots for offline kiosks.
+
+A kiosk keeps the student roster (IDNO, name, photo hash) in browser storage,
+so a scan can be acknowledged on the spot and queued for /kiosk/sync even
+when the server is slow or unreachable. Every student insert, update or
+delete gives that IDNO a new version in roster_changes (see
+DB_HELPER.init_db), so a kiosk holding version N asks for ?since=N and gets
+only the students changed after it plus the IDNOs removed.
+
+The full roster is encoded once per version and database and served from
+memory until a student changes; compress_response (response_cache.py)
+gzips it on the way out.
+"""
+import hashlib
+import json
+import threading
+
+from DB_HELPER import connect, db_path
+
+ROSTER_FIELDS = ('student_id', 'name', 'photo_hash')
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+_full = {}               # database path -> (version, encoded full roster)
+_lock = threading.Lock()
+
+
+def photo_hash(photo):
+    """Short hash of a student's stored photo; changes whenever the photo is replaced."""
+    if not photo:
+        return ''
+    return hashlib.blake2b(photo.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def roster_version():
+    """Current roster version of the active database (0 before any student exists)."""
+    conn = connect()
+    version = conn.execute('SELECT COALESCE(MAX(version), 0) FROM roster_changes').fetchone()[0]
+    conn.close()
+    return version
+
+
+def _load_full():
+    conn = connect()
+    c = conn.cursor()
+    try:
+        # One read transaction so the version matches the rows returned
+        c.execute('BEGIN')
+        c.execute('SELECT COALESCE(MAX(version), 0) FROM roster_changes')
+        version = c.fetchone()[0]
+        c.execute("SELECT student_id, name, COALESCE(photo, '') FROM students ORDER BY student_id")
+        students = [(idno, name, photo_hash(photo)) for idno, name, photo in c.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    return version, students
+
+
+def _load_delta(since):
+    conn = connect()
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN')
+        c.execute('SELECT COALESCE(MAX(version), 0) FROM roster_changes')
+        version = c.fetchone()[0]
+        c.execute("""SELECT r.student_id, s.name, COALESCE(s.photo, ''), s.id IS NULL
+                     FROM roster_changes r
+                     LEFT JOIN students s ON s.student_id = r.student_id
+                     WHERE r.version > ?
+                     ORDER BY r.version""", (since,))
+        rows = c.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+    students = [(idno, name, photo_hash(photo)) for idno, name, photo, removed in rows if not removed]
+    removed = [idno for idno, _, _, gone in rows if gone]
+    return version, students, removed
+
+
+def full_roster_json():
+    """Return (version, JSON body) of the whole roster, cached per version."""
+    path = db_path()
+    version = roster_version()
+    with _lock:
+        hit = _full.get(path)
+    if hit is not None and hit[0] == version:
+        return hit
+    version, students = _load_full()
+    body = _encode({
+        'success': True,
+        'version': version,
+        'full': True,
+        'fields': ROSTER_FIELDS,
+        'students': students,
+        'removed': [],
+    })
+    with _lock:
+        _full[path] = (version, body)
+    return version, body
+
+
+def roster_json(since=0):
+    """Return (version, JSON body) with the students changed after version `since`.
+
+    A since of 0, or one newer than the database (which was rebuilt), yields
+    the full roster.
+    """
+    if since > 0:
+        version, students, removed = _load_delta(since)
+        if since <= version:
+            return version, _encode({
+                'success': True,
+                'version': version,
+                'full': False,
+                'fields': ROSTER_FIELDS,
+                'students': students,
+                'removed': removed,
+            })
+    return full_roster_json()
@@ -0,0 +1,79 @@
+"""
+Typed row records for query results.
+
+Each record is a namedtuple: fields are readable by name (student.name)
+while staying a plain tuple underneath (no per-instance __dict__, so a
+100k-row listing costs no more than the raw tuples sqlite3 returns, and old
+index-based callers keep working). Queries should COALESCE nullable text
+columns in SQL so records need no per-field Python clean-up.
+
+fetch_records() builds records straight from a cursor through row_factory(),
+and records_json() serializes a list of them as JSON objects without Flask's
+key sorting.
+"""
+import functools
+import json
+from collections import namedtuple
+from itertools import repeat
+
+AdminRow = namedtuple('AdminRow', 'id name email password')
+AdminSession = namedtuple('AdminSession', 'id name email')
+StudentRef = namedtuple('StudentRef', 'id student_id name email')
+StudentRow = namedtuple('StudentRow', 'id student_id last_name first_name course level photo')
+StudentDetail = namedtuple('StudentDetail', 'id student_id name last_name first_name email course level photo')
+CourseRow = namedtuple('CourseRow', 'id course_code course_name instructor time_slot')
+CourseRef = namedtuple('CourseRef', 'id course_code course_name')
+AttendanceRow = namedtuple('AttendanceRow', 'id student_id name check_in_time qr_code_scanned')
+ScanRow = namedtuple('ScanRow', 'id student_id course_id check_in_time')
+AttendanceReportRow = namedtuple('AttendanceReportRow', 'student_id last_name first_name course level date_in time_in')
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+JSON_CHUNK = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def row_factory(cls):
+    """sqlite3 row_factory producing `cls` records (usable on a cursor or connection)."""
+    make = cls._make
+    return lambda cursor, row: make(row)
+
+
+def fetch_records(cursor, cls):
+    """Return all remaining cursor rows as `cls` records."""
+    # The row factory builds each record as sqlite3 reads the row, so no
+    # intermediate list of plain tuples is built
+    previous, cursor.row_factory = cursor.row_factory, row_factory(cls)
+    try:
+        return cursor.fetchall()
+    finally:
+        cursor.row_factory = previous
+
+
+def fetch_record(cursor, cls):
+    """Return the next cursor row as a `cls` record, or None."""
+    previous, cursor.row_factory = cursor.row_factory, row_factory(cls)
+    try:
+        return cursor.fetchone()
+    finally:
+        cursor.row_factory = previous
+
+
+def records_json(records, key=None, **extra):
+    """Serialize records as a JSON array of objects.
+
+    When key is given, returns a JSON object holding `extra` plus the array
+    under `key`, e.g. records_json(rows, 'students', success=True). Rows are
+    encoded JSON_CHUNK at a time so only that many temporary dicts exist at
+    once, whatever the size of the listing.
+    """
+    parts = []
+    if records:
+        fields = repeat(records[0]._fields)
+        for start in range(0, len(records), JSON_CHUNK):
+            chunk = records[start:start + JSON_CHUNK]
+            parts.append(_encode(list(map(dict, map(zip, fields, chunk))))[1:-1])
+    array = '[' + ','.join(parts) + ']'
+    if key is None:
+        return array
+    head = _encode(extra)[:-1]
+    return f"{head}{',' if extra else ''}{_encode(key)}:{array}}}"
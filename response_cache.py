@@ -0,0 +1,159 @@
+"""
+Response caching and compression for admin pages and JSON endpoints.
+
+Cached views are keyed by campus database, route, query string, negotiated content encoding
+and the data_versions counters of the tables they read, so any write to one
+of those tables (from the app or from a maintenance script) makes the next
+request recompute. Each entry stores the already-compressed body and its
+ETag; a repeat poll is a dict lookup, and a poll carrying a matching
+If-None-Match gets an empty 304.
+
+Responses that are not cached are still compressed by compress_response()
+when they are large enough and the client accepts it.
+"""
+import functools
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request, session
+
+from DB_HELPER import db_path, get_data_versions
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only when brotli is not installed
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_SIZE', '256'))
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/csv', 'text/css', 'application/javascript')
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def choose_encoding():
+    """Pick the best content encoding the client accepts, or None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def encode_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def _add_vary(response, *fields):
+    for field in fields:
+        response.vary.add(field)
+
+
+def _weaken_etag(response):
+    # A view's ETag names its uncompressed body; weak, it still matches
+    # If-None-Match (weak comparison) for every encoding of that body
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    """after_request hook: compress large HTML/JSON responses the client can decode.
+
+    An ETag set by the view is made weak on compressed responses (and on
+    304s to clients that would get one), so the gzip and identity bodies
+    never share a strong validator.
+    """
+    if response.status_code == 304:
+        encoding = choose_encoding()
+        etag = response.get_etag()[0]
+        # cached_response tags already name their encoding
+        if encoding and etag and not etag.endswith(f'-{encoding}'):
+            _weaken_etag(response)
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    _add_vary(response, 'Accept-Encoding')
+    body = response.get_data()
+    encoding = choose_encoding()
+    if len(body) < COMPRESS_MIN_SIZE or encoding is None:
+        return response
+    response.set_data(encode_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    _weaken_etag(response)
+    return response
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+def cached_response(tables, vary_session=(), extra_key=None):
+    """Cache a GET view's response until one of `tables` is written.
+
+    vary_session lists session keys the rendered output depends on, and
+    extra_key is an optional callable returning more key material (e.g.
+    today's date for views that default to it). Unauthenticated requests
+    and non-200 responses bypass the cache so auth checks still run.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'admin_id' not in session:
+                return view(*args, **kwargs)
+
+            response_class = current_app.response_class
+            encoding = choose_encoding()
+            key = (
+                db_path(),
+                request.script_root,
+                request.path,
+                tuple(sorted(request.args.items(multi=True))),
+                tuple(session.get(k) for k in vary_session),
+                extra_key() if extra_key else None,
+                get_data_versions(tables),
+                encoding,
+            )
+            with _lock:
+                entry = _cache.get(key)
+                if entry is not None:
+                    _cache.move_to_end(key)
+
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+                headers = {'Content-Type': response.headers.get('Content-Type')}
+                if len(body) >= COMPRESS_MIN_SIZE and encoding and response.mimetype in COMPRESSIBLE_TYPES:
+                    body = encode_body(body, encoding)
+                    headers['Content-Encoding'] = encoding
+                    etag = f'{etag}-{encoding}'
+                entry = (body, etag, headers)
+                with _lock:
+                    _cache[key] = entry
+                    while len(_cache) > CACHE_MAX_ENTRIES:
+                        _cache.popitem(last=False)
+
+            body, etag, headers = entry
+            response = response_class(body, headers=headers)
+            response.set_etag(etag)
+            # Admin data: browsers may keep it but must revalidate every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            _add_vary(response, 'Accept-Encoding', 'Cookie')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,203 @@
+"""
+Course-session resolution and in-memory enrollment rosters.
+
+Courses carry a time_slot such as "10:30 - 12:01 MW". resolve_course() picks
+the course whose slot contains the current local time, and is_enrolled()
+checks a student against a frozenset roster loaded once per course with
+get_course_students, so a scan is validated without extra queries. The
+StudentRef records behind each roster are kept too (get_course_roster), for
+analytics.
+
+Rosters and the parsed course schedule are dropped when invalidate() is
+called (after in-process enrollment changes) and whenever the courses,
+enrollment or students data_versions counters move, which is checked at
+most every REFRESH_INTERVAL seconds to catch writes from other processes. Each campus
+database (see campuses.py) keeps its own set of these caches.
+
+A course with no enrollment rows at all is treated as open: anyone may
+check in, matching the behaviour before rosters existed.
+"""
+import re
+import threading
+import time
+from datetime import datetime
+
+from DB_HELPER import db_path, get_all_courses, get_course_students, get_data_versions
+from records import CourseRef
+
+REFRESH_INTERVAL = 5.0
+
+_DAY_CODES = {
+    'M': 0, 'T': 1, 'W': 2, 'TH': 3, 'R': 3, 'F': 4,
+    'S': 5, 'SA': 5, 'SU': 6, 'U': 6,
+}
+_DAY_RE = re.compile(r'TH|SA|SU|M|T|W|R|F|S|U')
+_SLOT_RE = re.compile(
+    r'^\s*(\d{1,2}):(\d{2})\s*(AM|PM)?\s*-\s*(\d{1,2}):(\d{2})\s*(AM|PM)?\s*([A-Za-z]*)\s*$',
+    re.IGNORECASE
+)
+
+_lock = threading.Lock()
+_shards = {}             # database path -> _ShardCache
+
+
+class _ShardCache:
+    __slots__ = ('courses', 'rosters', 'versions', 'checked_at')
+
+    def __init__(self):
+        self.courses = None      # list of (CourseRef, schedule)
+        self.rosters = {}        # course_id -> (StudentRefs, frozenset of students.id or None if open)
+        self.versions = None
+        self.checked_at = 0.0
+
+
+def _minutes(hour, minute, meridiem):
+    hour = int(hour) % 24
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.upper() == 'PM' else 0)
+    elif 1 <= hour <= 6:
+        # Slots are written 12-hour without AM/PM ("1:00 - 2:30 TTh"); classes don't start at 1-6 AM
+        hour += 12
+    return hour * 60 + int(minute)
+
+
+def parse_time_slot(time_slot):
+    """Parse "HH:MM - HH:MM DAYS" into (weekdays, start_minute, end_minute), or None.
+
+    Days use M T W Th F Sa Su (R/U also accepted); no days means every day.
+    Without AM/PM, hours 1-6 are afternoon and an end at or before the start
+    is taken 12 hours later; slots that still end before they start are rejected.
+
+    >>> [divmod(m, 60) for m in parse_time_slot("10:30 - 12:01 MW")[1:]]
+    [(10, 30), (12, 1)]
+    >>> [divmod(m, 60) for m in parse_time_slot("1:00 - 2:30 TTh")[1:]]
+    [(13, 0), (14, 30)]
+    >>> [divmod(m, 60) for m in parse_time_slot("11:00 - 1:00 MWF")[1:]]
+    [(11, 0), (13, 0)]
+    >>> [divmod(m, 60) for m in parse_time_slot("8:00 - 9:30 PM")[1:]]
+    [(20, 0), (21, 30)]
+    >>> parse_time_slot("10:00 PM - 1:00 AM") is None
+    True
+    """
+    match = _SLOT_RE.match(time_slot or '')
+    if not match:
+        return None
+    h1, m1, ap1, h2, m2, ap2, days = match.groups()
+    end = _minutes(h2, m2, ap2 or ap1)
+    start = _minutes(h1, m1, ap1)
+    if ap2 and not ap1 and _minutes(h1, m1, ap2) < end:
+        # "8:00 - 9:30 PM": a trailing AM/PM covers both times
+        start = _minutes(h1, m1, ap2)
+    if end <= start and not (ap2 or ap1):
+        end += 12 * 60
+    if not start < end < 24 * 60:
+        return None
+    codes = days.upper()
+    tokens = _DAY_RE.findall(codes)
+    if ''.join(tokens) != codes:
+        return None
+    weekdays = frozenset(_DAY_CODES[d] for d in tokens)
+    return (weekdays or frozenset(range(7))), start, end
+
+
+def invalidate():
+    """Drop the active database's cached schedules and rosters; the next lookup reloads them."""
+    with _lock:
+        _shards.pop(db_path(), None)
+
+
+def _shard(recheck=False):
+    """Return the active database's cache, refreshed if its data_versions moved.
+
+    The counters are read at most every REFRESH_INTERVAL seconds unless recheck is set.
+    """
+    path = db_path()
+    shard = _shards.get(path)
+    if shard is None:
+        with _lock:
+            shard = _shards.setdefault(path, _ShardCache())
+    now = time.monotonic()
+    if not recheck and now - shard.checked_at < REFRESH_INTERVAL:
+        return shard
+    # Roster records carry student names, so student edits drop them too
+    versions = get_data_versions(('courses', 'enrollment', 'students'))
+    with _lock:
+        shard.checked_at = now
+        if versions != shard.versions:
+            shard.versions = versions
+            shard.courses = None
+            shard.rosters.clear()
+    return shard
+
+
+def _load_courses():
+    shard = _shard()
+    courses = shard.courses
+    if courses is None:
+        courses = [
+            (CourseRef(c.id, c.course_code, c.course_name), parse_time_slot(c.time_slot))
+            for c in get_all_courses()
+        ]
+        with _lock:
+            shard.courses = courses
+    return courses
+
+
+def get_course(course_id):
+    """Return the CourseRef for a course id, or None."""
+    for course, schedule in _load_courses():
+        if course.id == course_id:
+            return course
+    return None
+
+
+def get_course_schedule(course_id):
+    """Return the parsed time_slot (weekdays, start_minute, end_minute) of a course, or None."""
+    for course, schedule in _load_courses():
+        if course.id == course_id:
+            return schedule
+    return None
+
+
+def resolve_course(now=None):
+    """Return the CourseRef of the course in session at `now`, or None."""
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    weekday = now.weekday()
+    for course, schedule in _load_courses():
+        if schedule is None:
+            continue
+        weekdays, start, end = schedule
+        if weekday in weekdays and start <= minute <= end:
+            return course
+    return None
+
+
+def _load_roster(course_id, recheck=False):
+    shard = _shard(recheck)
+    roster = shard.rosters.get(course_id)
+    if roster is None:
+        students = get_course_students(course_id)
+        roster = (students, frozenset(s.id for s in students) if students else None)
+        with _lock:
+            shard.rosters[course_id] = roster
+    return roster
+
+
+def get_roster(course_id):
+    """Return the frozenset of enrolled students.id for a course, or None if it has no roster."""
+    return _load_roster(course_id)[1]
+
+
+def get_course_roster(course_id):
+    """Return the enrolled students of a course as a shared list of StudentRef records (empty if open).
+
+    Unlike is_enrolled, this always checks data_versions first, so the names are current.
+    """
+    return _load_roster(course_id, recheck=True)[0]
+
+
+def is_enrolled(course_id, student_pk):
+    """True if the student (students.id) may check in to the course."""
+    roster = get_roster(course_id)
+    return roster is None or student_pk in roster
@@ -0,0 +1,60 @@
+"""
+Idempotency keys for /scan-qr.
+
+Kiosks tag each scan with a client-generated scan_id (JSON field "scan_id"
+or an Idempotency-Key header) and resend the same id when a request times
+out. The first successful response is kept in a bounded in-process LRU, so
+a retry is answered from memory without touching the database. Retries that
+miss the LRU (another worker, a restart, an evicted entry) are caught by the
+partial UNIQUE index on attendance.scan_id, which turns the second insert
+into a no-op; see DB_HELPER.record_scan. Entries are kept per campus
+database, so shards never answer each other's retries.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from DB_HELPER import db_path
+
+MAX_ENTRIES = 10000
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+_SCAN_ID_RE = re.compile(r'[A-Za-z0-9._:-]{1,64}')
+
+_responses = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalize_scan_id(value):
+    """Return the scan id as a stripped string, or None if it is not a valid key."""
+    if not isinstance(value, (str, int)) or isinstance(value, bool):
+        return None
+    value = str(value).strip()
+    return value if _SCAN_ID_RE.fullmatch(value) else None
+
+
+def lookup_response(scan_id):
+    """Return the cached (qr_code, payload, status) for scan_id, or None."""
+    key = (db_path(), scan_id)
+    with _lock:
+        hit = _responses.get(key)
+        if hit is not None:
+            _responses.move_to_end(key)
+        return hit
+
+
+def remember_response(scan_id, qr_code, payload, status):
+    """Cache the response sent for scan_id, evicting the oldest entries past MAX_ENTRIES."""
+    key = (db_path(), scan_id)
+    with _lock:
+        _responses[key] = (qr_code, payload, status)
+        _responses.move_to_end(key)
+        while len(_responses) > MAX_ENTRIES:
+            _responses.popitem(last=False)
+
+
+def clear():
+    """Drop every cached response."""
+    with _lock:
+        _responses.clear()
@@ -0,0 +1,102 @@
+"""
+Online backups of attendance.db for reporting.
+
+Uses the sqlite3 backup API to copy the live database in a single step. The
+database runs in WAL mode (see DB_HELPER.init_db), so the copy reads one
+consistent version while scans keep writing; a step-by-step backup would
+instead restart from scratch after every write and might never finish under
+load. The copy is written to a temporary file and atomically renamed over the
+previous snapshot, so readers always see a complete database. Each campus database
+gets its own snapshot file next to it (<name>.snapshot.db); SNAPSHOT_PATH
+applies to the default database.
+
+Usage:
+    python snapshot.py            # take one snapshot now
+    python snapshot.py 300        # take a snapshot every 300 seconds
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from DB_HELPER import DB_PATH, db_path
+
+SNAPSHOT_PATH = os.environ.get(
+    'ATTENDANCE_SNAPSHOT_PATH',
+    os.path.splitext(os.path.abspath(DB_PATH))[0] + '.snapshot.db'
+)
+
+_lock = threading.Lock()
+_scheduler = None
+
+
+def snapshot_path(database=None):
+    """Return the snapshot file for a database (default: the active one)."""
+    database = os.path.abspath(database or db_path())
+    if database == os.path.abspath(DB_PATH):
+        return SNAPSHOT_PATH
+    return os.path.splitext(database)[0] + '.snapshot.db'
+
+
+def take_snapshot(database=None):
+    """Copy a live database (default: the active one) to its snapshot; return the snapshot time."""
+    database = database or db_path()
+    path = snapshot_path(database)
+    tmp_path = path + '.tmp'
+    with _lock:
+        src = sqlite3.connect(database)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst, pages=-1)
+            # The copy is a standalone file; keep no -wal/-shm next to it
+            dst.execute('PRAGMA journal_mode=DELETE').fetchone()
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp_path, path)
+    return os.path.getmtime(path)
+
+
+def snapshot_info():
+    """Return (path, taken_at, age_seconds) for the active database's latest snapshot, or None if there is none."""
+    path = snapshot_path()
+    try:
+        taken_at = os.path.getmtime(path)
+    except OSError:
+        return None
+    return path, taken_at, max(0.0, time.time() - taken_at)
+
+
+def _run_scheduler(interval, databases):
+    while True:
+        for database in databases:
+            try:
+                take_snapshot(database=database)
+            except sqlite3.Error as e:
+                print(f"Snapshot of {database} failed: {e}")
+        time.sleep(interval)
+
+
+def start_scheduler(interval, databases=None):
+    """Start a daemon thread that snapshots every `interval` seconds (once per process).
+
+    databases defaults to the default database only.
+    """
+    global _scheduler
+    if interval <= 0 or _scheduler is not None:
+        return _scheduler
+    _scheduler = threading.Thread(target=_run_scheduler, args=(interval, list(databases or [DB_PATH])),
+                                  name='attendance-snapshot', daemon=True)
+    _scheduler.start()
+    return _scheduler
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        interval = float(sys.argv[1])
+        print(f"Snapshotting {DB_PATH} -> {SNAPSHOT_PATH} every {interval:g}s")
+        _run_scheduler(interval, [DB_PATH])
+    else:
+        take_snapshot()
+        print(f"✓ Snapshot written to {SNAPSHOT_PATH}")
@@ -0,0 +1,149 @@
+"""
+Fingerprinted, pre-compressed static assets.
+
+Running this module copies every CSS/JS/font file under static/ into
+static/dist/ with a content hash in its name, writes .gz (and .br when the
+brotli package is installed) siblings next to each text copy, and records
+the mapping in static/dist/manifest.json. Relative url() references in CSS
+(e.g. font-awesome's ../fonts/) are rewritten to the fingerprinted names. Templates call asset_url('js/html5-qrcode.min.js')
+to get the fingerprinted URL, which is served with a one-year immutable
+Cache-Control and the best pre-compressed variant the browser accepts. When
+no manifest exists, asset_url falls back to the plain /static/ URL.
+
+Usage:
+    python static_assets.py
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz variants when brotli is not installed
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+ASSET_EXTENSIONS = ('.css', '.js', '.woff2', '.woff', '.ttf', '.eot', '.svg')
+# woff/woff2 are already compressed; everything else gets .gz/.br siblings
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.ttf', '.eot', '.svg')
+SKIP_DIRS = (DIST_DIR, os.path.join(STATIC_DIR, 'photos'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_manifest = None
+
+_CSS_URL_RE = re.compile(r'''url\((['"]?)([^'")]+)\1\)''')
+
+
+def _rewrite_css_urls(css, rel, manifest):
+    """Point relative url() references in a CSS file at their fingerprinted copies."""
+    base = posixpath.dirname(rel)
+
+    def replace(match):
+        quote, url = match.groups()
+        if ':' in url or url.startswith('/'):
+            return match.group(0)
+        # Keep ?v=... and #fragment suffixes (IE/SVG font hacks rely on them)
+        cut = min((i for i in (url.find('?'), url.find('#')) if i >= 0), default=len(url))
+        hashed = manifest.get(posixpath.normpath(posixpath.join(base, url[:cut])))
+        if hashed is None:
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(hashed, base)}{url[cut:]}{quote})'
+
+    return _CSS_URL_RE.sub(replace, css)
+
+
+def build():
+    """Fingerprint and pre-compress static assets; return the manifest."""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    sources = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) not in SKIP_DIRS]
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                sources.append(os.path.join(root, name))
+    # CSS goes last so the files it references are already fingerprinted
+    sources.sort(key=lambda src: src.endswith('.css'))
+
+    manifest = {}
+    for src in sources:
+        rel = os.path.relpath(src, STATIC_DIR).replace(os.sep, '/')
+        with open(src, 'rb') as f:
+            data = f.read()
+        if rel.endswith('.css'):
+            data = _rewrite_css_urls(data.decode('utf-8'), rel, manifest).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(rel)
+        if stem.endswith('.min'):
+            stem, ext = stem[:-4], '.min' + ext
+        hashed = f'{stem}.{digest}{ext}'
+        dest = os.path.join(DIST_DIR, hashed)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, 'wb') as f:
+            f.write(data)
+        if rel.endswith(PRECOMPRESS_EXTENSIONS):
+            with open(dest + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(dest + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+        manifest[rel] = hashed
+        print(f"  {rel} -> dist/{hashed} ({len(data)} B)")
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest():
+    """(Re)load the manifest written by build(); empty when assets are not built."""
+    global _manifest
+    try:
+        with open(MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+    except (OSError, ValueError):
+        _manifest = {}
+    return _manifest
+
+
+def asset_url(path):
+    """URL for a static asset: fingerprinted when built, plain /static/ otherwise."""
+    manifest = _manifest if _manifest is not None else load_manifest()
+    hashed = manifest.get(path)
+    if hashed is None:
+        return url_for('static', filename=path)
+    return url_for('serve_asset', filename=hashed)
+
+
+def send_asset(filename):
+    """Serve a fingerprinted asset, preferring a pre-compressed variant."""
+    if not os.path.isfile(os.path.join(DIST_DIR, filename)):
+        abort(404)
+    accepted = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix, max_age=31536000)
+            response.headers['Content-Encoding'] = encoding
+            # Keep the original type rather than application/gzip
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+if __name__ == '__main__':
+    print(f"Building static assets into {DIST_DIR}")
+    build()
+    print(f"✓ Wrote {MANIFEST_PATH}")